@@ -18,51 +18,88 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import numpy as np
 from math import sin, sqrt
-from collections import namedtuple
-from numpy.fft import fft2, ifft2, fftshift, ifftshift
+from collections import namedtuple, OrderedDict
+from numpy.fft import fftshift, ifftshift
+from fft_backend import get_backend
 
 pi = np.pi
 
+# real and complex dtypes for the precision option of the solvers, the holograms are only 8 bit in the end
+precisions = {'single': (np.float32, np.complex64), 'double': (np.float64, np.complex128)}
+
+
+def cis(phase, out=None):
+    """
+    exp(1j * phase) for a real phase, keeping its precision
+    Computed as cos + 1j * sin, which numpy vectorizes, unlike its complex exp
+    """
+    if out is None:
+        out = np.empty(phase.shape, dtype=np.result_type(phase, np.complex64))
+    np.cos(phase, out=out.real)
+    np.sin(phase, out=out.imag)
+    return out
+
 
 class GSFresult(
-    namedtuple('GSFresult', ['phase', 'target_fields', 'lenses', 'algorithm', 'errors', 'correlations'])):
+    namedtuple('GSFresult', ['phase', 'target_fields', 'lenses', 'algorithm', 'errors', 'correlations',
+                             'iterations'])):
     """
     Storage class for GSF results
     Namedtuple doesn't support default args :(
     """
 
-    def __new__(cls, phase, target_fields=None, lenses=None, algorithm=None, errors=None, correlations=None):
-        return super(GSFresult, cls).__new__(cls, phase, target_fields, lenses, algorithm, errors, correlations)
+    def __new__(cls, phase, target_fields=None, lenses=None, algorithm=None, errors=None, correlations=None,
+                iterations=None):
+        return super(GSFresult, cls).__new__(cls, phase, target_fields, lenses, algorithm, errors, correlations,
+                                             iterations)
 
 
-def GS_FFT(target_amplitude, iterations=30, replace_middle=True):
+def converged(corrs, tolerance, window=4):
+    """
+    Plateau test on the correlations of the iterations so far (scalars, or per plane arrays which are summed)
+    The mean over the last window iterations is compared with the window before, since with several planes the
+    correlation alternates from one iteration to the next while the plane weights adapt
+    :param tolerance: relative change considered a plateau, None to never stop early
+    """
+    if tolerance is None or len(corrs) < 2 * window:
+        return False
+    totals = [np.sum(c) for c in corrs[-2 * window:]]
+    last, previous = np.mean(totals[window:]), np.mean(totals[:window])
+    return last - previous <= tolerance * abs(last)
+
+
+def GS_FFT(target_amplitude, iterations=30, replace_middle=True, tolerance=None):
     # simple GS FFT propagator
+    # iterations is the maximum, with a tolerance it stops once the correlation plateaus
     assert target_amplitude.shape[0] == target_amplitude.shape[1]
+    fft = get_backend()
     ini_amplitude = np.random.rand(*target_amplitude.shape)
     slm_field = ini_amplitude
 
     corrs = []
     for i in range(iterations):
-        target_field = fftshift(fft2(fftshift(slm_field)))
+        target_field = fftshift(fft.fft2(fftshift(slm_field)))
 
         x = np.abs(target_field)
         corrs.append(np.corrcoef(x.ravel(), target_amplitude.ravel())[0, 1])
-        if i == iterations - 1:
-            export_target_field = np.abs(target_field.copy())
+        export_target_field = x
         target_field = np.abs(target_amplitude) * np.exp(1j * np.angle(target_field))
-        slm_field = fftshift(ifft2(fftshift(target_field)))
+        slm_field = fftshift(fft.ifft2(fftshift(target_field)))
         slm_field = ini_amplitude * np.exp(1j * np.angle(slm_field))
+        if converged(corrs, tolerance):
+            break
 
     if replace_middle:  # replace middle of export field, there's always a high intensity pixel there from the fft
         export_target_field[int(export_target_field.shape[0] / 2), int(export_target_field.shape[1] / 2)] = 0
 
     return GSFresult(phase=np.angle(slm_field) + pi, target_fields=[export_target_field], correlations=corrs,
-                     algorithm='GSF_2D')
+                     algorithm='GSF_2D', iterations=len(corrs))
 
 
 def GS_new(target_amplitude, iterations=30, replace_middle=True):
     # simple GS FFT propagator
     assert target_amplitude.shape[0] == target_amplitude.shape[1]
+    fft = get_backend()
     ini_amplitude = np.random.rand(*target_amplitude.shape)
     slm_field = ini_amplitude
     holo_phase = np.random.rand(*target_amplitude.shape)
@@ -80,11 +117,11 @@ def GS_new(target_amplitude, iterations=30, replace_middle=True):
 
 
         hologram = ini_amplitude *  np.exp(1j * holo_phase)
-        targ_approx = fftshift(fft2(hologram))
+        targ_approx = fftshift(fft.fft2(hologram))
         if i == iterations - 1:
             export_target_field = np.abs(targ_approx.copy())
         targ_approx = target_amplitude * np.exp(1j * np.angle(targ_approx))
-        holo_approx = ifftshift(ifft2(fftshift(targ_approx)))
+        holo_approx = ifftshift(fft.ifft2(fftshift(targ_approx)))
         holo_phase = np.angle(holo_approx)
 
     if replace_middle:  # replace middle of export field, there's always a high intensity pixel there from the fft
@@ -157,6 +194,35 @@ def lens(ini_field_shape, side_length, z, wavelength, focal_length=1, m=1):
     return np.fmod(clens, 2 * pi)
 
 
+zernike_bases = {}  # shape -> defocus and spherical aberration polynomials over the unit square grid
+lens_cache = OrderedDict()  # (Z, wavelength, shape, dtype) -> (phase, exp(1j * phase)), most recently used last
+lens_cache_max_mb = 512  # ~10 MB per entry at 792x792 single precision, so ~50 (plane, wavelength) pairs
+
+
+def zernike_basis(shape):
+    """
+    Radial Zernike polynomials used by lens_zernicke, computed once per shape (or side, for square shapes)
+    Coordinates are normalized to the longer side, so a rectangular basis is the middle of the square one
+    """
+    if np.isscalar(shape):
+        shape = (shape, shape)
+    shape = tuple(shape)
+    basis = zernike_bases.get(shape)
+    if basis is None:
+        side = max(shape)
+        x = np.linspace(-1, 1, side)
+        rows = x[(side - shape[0]) // 2:][:shape[0]]
+        columns = x[(side - shape[1]) // 2:][:shape[1]]
+        xp, yp = np.meshgrid(columns, rows)
+
+        r = np.sqrt(xp ** 2 + yp ** 2)
+        z4 = np.sqrt(3) * (2 * r ** 2 - 1)
+        z11 = np.sqrt(5) * (6 * r ** 4 - 6 * r ** 2 + 1)
+        z22 = np.sqrt(7) * (20 * r ** 6 - 30 * r ** 4 + 12 * r ** 2 - 1)
+        basis = zernike_bases[shape] = (z4, z11, z22)
+    return basis
+
+
 def lens_zernicke(ini_field_shape, side_length, z, wavelength):
     n = 1.33  # refractive index
     alpha = 0.743259997  # lens angle, radians
@@ -168,14 +234,32 @@ def lens_zernicke(ini_field_shape, side_length, z, wavelength):
         1 + 3 / 4 * sin(alpha) ** 2 + 15 / 18 * sin(alpha) ** 4)  # 1st spherical
     c22 = n * k * z * sin(alpha) ** 6 / (640 * pi * sqrt(7)) * (1 + 5 / 4 * sin(alpha) ** 2)  # 2nd spherical
 
-    dx = side_length / ini_field_shape[1]  # should it be 1 or 0 of the shape?
+    # dx = side_length / ini_field_shape[1]  # should it be 1 or 0 of the shape?
     # x = np.linspace(-side_length / 2, side_length / 2 - dx, ini_field_shape[1])
-    x = np.linspace(-1, 1, ini_field_shape[1])
-    xp, yp = np.meshgrid(x, x)
-
-    r = np.sqrt(xp ** 2 + yp ** 2)
-    z4 = np.sqrt(3) * (2 * r ** 2 - 1)
-    z11 = np.sqrt(5) * (6 * r ** 4 - 6 * r ** 2 + 1)
-    z22 = np.sqrt(7) * (20 * r ** 6 - 30 * r ** 4 + 12 * r ** 2 - 1)
+    z4, z11, z22 = zernike_basis(ini_field_shape)
 
     return np.remainder((c4 * z4 + c11 * z11 + c22 * z22), 1) * 2 * pi
+
+
+def lens_cache_size():
+    """ Bytes held by the lens cache """
+    return sum(a.nbytes for entry in lens_cache.values() for a in entry)
+
+
+def cached_lens(shape, z, wavelength, dtype=np.complex128):
+    """
+    lens_zernicke phase and its complex exponential (of the given dtype), kept for the most recently used
+    (Z, wavelength, shape, dtype), up to lens_cache_max_mb
+    The arrays are shared, so they're read only.  exp(-1j * phase) is the conjugate of the exponential.
+    """
+    key = (round(float(z), 6), round(float(wavelength), 3), tuple(shape), np.dtype(dtype).str)
+    entry = lens_cache.pop(key, None)
+    if entry is None:
+        phase = lens_zernicke(shape, shape[1] / 2, z, wavelength)
+        entry = (phase, np.exp(1j * phase).astype(dtype))
+        for a in entry:
+            a.flags.writeable = False
+    lens_cache[key] = entry
+    while len(lens_cache) > 1 and lens_cache_size() > lens_cache_max_mb * 2 ** 20:
+        lens_cache.popitem(last=False)
+    return entry
@@ -18,8 +18,9 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from __future__ import print_function, division
 import numpy as np
-from numpy.fft import fft2, ifft2, fftshift, ifftshift
-from GSF import lens_zernicke as lens, GSFresult
+from numpy.fft import fftshift, ifftshift
+from fft_backend import get_backend
+from GSF import cached_lens, cis, GSFresult, converged, precisions
 
 pi = np.pi
 
@@ -33,10 +34,15 @@ def normedplanes(targets, amps):
     return np.asarray(res) / denom
 
 
-def GS_3D(target_amplitudes, target_Zs, wavelength=960, iterations=30, replace_middle=True):
+def GS_3D(target_amplitudes, target_Zs, wavelength=960, iterations=30, replace_middle=True, tolerance=None,
+          initial_phase=None):
     """
     :param target_amplitudes: list of target arrays
     :param target_Zs: list of floats/ints
+    :param iterations: maximum number of iterations
+    :param tolerance: stop once the summed plane correlations change by less than this (relative), None to always run
+    all iterations
+    :param initial_phase: phase to start from (ie the solution for a similar target), instead of random
     :return:
     """
 
@@ -46,6 +52,7 @@ def GS_3D(target_amplitudes, target_Zs, wavelength=960, iterations=30, replace_m
 
     target_amplitudes = [t**.5 for t in target_amplitudes]
 
+    fft = get_backend()
     target_ratios = normedplanes(target_amplitudes, target_amplitudes)
     target_ratios /= target_ratios.sum()
     field_ratios = target_ratios.copy()
@@ -53,18 +60,19 @@ def GS_3D(target_amplitudes, target_Zs, wavelength=960, iterations=30, replace_m
     print ("Target ratios: ", target_ratios)
     # ini_amplitudes = [np.random.rand(*target_amplitudes[0].shape) for i in target_amplitudes]
     ini_amplitudes = [np.random.rand(*target_amplitudes[0].shape),] * len(target_amplitudes)
-    unified_slm_field = ini_amplitudes[0]
+    unified_slm_field = ini_amplitudes[0] if initial_phase is None else initial_phase
 
-    lenses = [lens(ini_amplitudes[0].shape, ini_amplitudes[0].shape[1] / 2, Z, wavelength) for Z in target_Zs]
+    lenses, lens_exps = zip(*[cached_lens(ini_amplitudes[0].shape, Z, wavelength) for Z in target_Zs])
 
     export_target_fields = []
     corrs = []
     for i in range(iterations):
         slm_fields = []
         export_target_fields = []
+        unified_exp = np.exp(1j * unified_slm_field)
         for planenum, plane_lens in enumerate(lenses):
-            slm_field = ini_amplitudes[planenum] * np.exp(1j * (unified_slm_field - plane_lens))
-            target_field = fftshift(fft2((slm_field)))
+            slm_field = ini_amplitudes[planenum] * unified_exp * lens_exps[planenum].conj()
+            target_field = fftshift(fft.fft2((slm_field)))
 
             export_target_field = np.abs(target_field)**2
             if replace_middle:  # replace middle of export field, there's always a high intensity pixel there from the fft
@@ -74,7 +82,7 @@ def GS_3D(target_amplitudes, target_Zs, wavelength=960, iterations=30, replace_m
 
             target_field = np.abs(target_amplitudes[planenum]) * np.exp(1j * np.angle(target_field))
 
-            slm_field = fftshift(ifft2(fftshift(target_field)))
+            slm_field = fftshift(fft.ifft2(fftshift(target_field)))
             slm_field = (np.angle(slm_field) + plane_lens)
             slm_field = ini_amplitudes[planenum] * np.exp(1j * slm_field)
             slm_fields.append(slm_field)
@@ -88,7 +96,189 @@ def GS_3D(target_amplitudes, target_Zs, wavelength=960, iterations=30, replace_m
             field_ratios += (target_ratios - c) / 2.
         slm_fields = [s * field_ratios[ii] for ii, s in enumerate(slm_fields)]
         unified_slm_field = np.angle(np.dstack(slm_fields).sum(2)) % (2 * pi)
+        if converged(corrs, tolerance):
+            break
 
     nr = normedplanes(target_amplitudes, export_target_fields)
     print ("Targets: ", target_ratios, nr/nr.sum())
-    return GSFresult(unified_slm_field, export_target_fields, correlations=corrs, algorithm='GS_3D')
+    return GSFresult(unified_slm_field, export_target_fields, correlations=corrs, algorithm='GS_3D',
+                     iterations=len(corrs))
+
+
+def GS_3D_batched(target_amplitudes, target_Zs, wavelength=960, iterations=30, replace_middle=True, tolerance=None,
+                  initial_phase=None, precision='single'):
+    """
+    Same algorithm as GS_3D, but all planes are stacked into a single (nplanes, N, N) array, so each iteration
+    runs one batched forward and one batched inverse FFT instead of looping over the planes in python.
+    The lens exponentials come from the lens cache, so they aren't computed for every request.
+    :param target_amplitudes: list of target arrays
+    :param target_Zs: list of floats/ints
+    :param iterations: maximum number of iterations
+    :param tolerance: stop once the summed plane correlations change by less than this (relative), see GS_3D
+    :param initial_phase: phase to start from, instead of random
+    :param precision: 'single' (float32/complex64) or 'double', see precision_parity.py for the difference
+    :return:
+    """
+
+    assert len(target_amplitudes) == len(target_Zs)
+    assert len(list(set([t.shape for t in target_amplitudes]))) == 1, "All target amplitudes must be the same shape"
+    assert target_amplitudes[0].shape[0] == target_amplitudes[0].shape[1], "Target amplitudes should be square!"
+
+    axes = (-2, -1)
+    real, complex_ = precisions[precision]
+    target_amplitudes = np.stack([t**.5 for t in target_amplitudes]).astype(real)
+    shape = target_amplitudes.shape[1:]
+
+    fft = get_backend()
+    target_ratios = normedplanes(target_amplitudes, target_amplitudes)
+    target_ratios /= target_ratios.sum()
+    field_ratios = target_ratios.copy()
+
+    print ("Target ratios: ", target_ratios)
+    ini_amplitude = np.random.rand(*shape).astype(real)
+    unified_slm_field = ini_amplitude if initial_phase is None else initial_phase.astype(real)
+
+    lens_out = np.stack([cached_lens(shape, Z, wavelength, complex_)[1] for Z in target_Zs])
+    lens_in = lens_out.conj()
+
+    export_target_fields = None
+    corrs = []
+    for i in range(iterations):
+        slm_fields = ini_amplitude * cis(unified_slm_field) * lens_in
+        target_fields = fftshift(fft.fft2(slm_fields), axes=axes)
+
+        export_target_fields = np.abs(target_fields)**2
+        if replace_middle:  # replace middle of export field, there's always a high intensity pixel there from the fft
+            export_target_fields[:, int(shape[0] / 2), int(shape[1] / 2)] = 0
+
+        target_fields = target_amplitudes * cis(np.angle(target_fields))
+
+        slm_fields = fftshift(fft.ifft2(fftshift(target_fields, axes=axes)), axes=axes)
+        # the (shared, positive) ini_amplitude doesn't change the phase of the weighted sum, so it isn't reapplied here
+        slm_fields = cis(np.angle(slm_fields)) * lens_out
+
+        corrs.append(normedplanes(target_amplitudes, export_target_fields))
+
+        c = corrs[-1]
+        c = np.asarray(c) / sum(c)
+
+        if i > 1:
+            field_ratios += (target_ratios - c) / 2.
+        unified_slm_field = np.angle(np.tensordot(field_ratios.astype(real), slm_fields, axes=1)) % (2 * pi)
+        if converged(corrs, tolerance):
+            break
+
+    if export_target_fields is None:  # no iterations
+        return GSFresult(unified_slm_field, None, correlations=corrs, algorithm='GS_3D_batched', iterations=0)
+    nr = normedplanes(target_amplitudes, export_target_fields)
+    print ("Targets: ", target_ratios, nr/nr.sum(), "after %d iterations" % len(corrs))
+    return GSFresult(unified_slm_field, list(export_target_fields), correlations=corrs, algorithm='GS_3D_batched',
+                     iterations=len(corrs))
+
+
+def GS_3D_buffered(target_amplitudes, target_Zs, wavelength=960, iterations=30, replace_middle=True, tolerance=None,
+                   initial_phase=None, precision='single', export=False):
+    """
+    Same algorithm as GS_3D_batched, with the work buffers allocated once, before iterating, and in place operations,
+    so the only arrays allocated per iteration are the FFT outputs (owned by the FFT backend).
+    The fftshifts are folded into checkerboard (+-1) factors, premultiplied into the lenses and the targets:
+    fftshift(fft2(x)) == fft2(x * checkerboard), fftshift(ifft2(fftshift(x))) == ifft2(x * checkerboard) * checkerboard
+    (times -1 if half the sizes add up to odd), which needs even sizes.
+    The targets can be rectangular, ie the SLM size.
+    Phase only fields are made by dividing by the magnitude, instead of angle and exp.
+    The target intensities and correlations are only computed when they're used: for the plane weights (several
+    planes), for early stopping (tolerance), or on the last iteration for export.
+    :param export: also return the target intensities of the last iteration, as target_fields
+    :return:
+    """
+
+    assert len(target_amplitudes) == len(target_Zs)
+    assert len(list(set([t.shape for t in target_amplitudes]))) == 1, "All target amplitudes must be the same shape"
+    assert not any(n % 2 for n in target_amplitudes[0].shape), "Target amplitudes should have even sizes!"
+
+    real, complex_ = precisions[precision]
+    fft = get_backend()
+    nplanes = len(target_Zs)
+    target_amplitudes = np.stack([t**.5 for t in target_amplitudes]).astype(real)
+    shape = target_amplitudes.shape[1:]
+    middle = (slice(None), int(shape[0] / 2), int(shape[1] / 2))
+
+    # normedplanes, split into what's constant and what changes every iteration
+    flat_targets = target_amplitudes.reshape(nplanes, -1)
+    truncated_targets = np.trunc(flat_targets)
+    target_norm = sum(float(np.dot(t, t)) for t in flat_targets) ** .5
+
+    def correlations(intensities):
+        flat = intensities.reshape(nplanes, -1)
+        res = np.array([np.dot(t, a) for t, a in zip(truncated_targets, flat)], dtype=float)
+        return res / (target_norm * sum(float(np.dot(a, a)) for a in flat) ** .5)
+
+    target_ratios = np.array([np.dot(tt, t) for tt, t in zip(truncated_targets, flat_targets)], dtype=float)
+    target_ratios /= target_ratios.sum()
+    field_ratios = target_ratios.copy()
+    print ("Target ratios: ", target_ratios)
+
+    checkerboard = np.ones(shape, dtype=real)
+    checkerboard[::2, 1::2] = -1
+    checkerboard[1::2, ::2] = -1
+    sign = -1 if (shape[0] // 2 + shape[1] // 2) % 2 else 1
+
+    ini_amplitude = np.random.rand(*shape).astype(real)
+    lens_exps = np.stack([cached_lens(shape, Z, wavelength, complex_)[1] for Z in target_Zs])
+    slm_in = lens_exps.conj() * (ini_amplitude * checkerboard)
+    slm_out = lens_exps * (checkerboard * sign)
+    del lens_exps
+    target_amplitudes *= checkerboard
+
+    # work buffers
+    unified_slm_field = cis(ini_amplitude if initial_phase is None else initial_phase.astype(real))  # phase only
+    unified_magnitude = np.empty(shape, dtype=real)
+    fields = np.empty((nplanes,) + shape, dtype=complex_)
+    magnitudes = np.empty((nplanes,) + shape, dtype=real)
+    use_correlations = nplanes > 1 or tolerance is not None
+    intensities = np.empty((nplanes,) + shape, dtype=real) if use_correlations or export else None
+    weights = np.empty(nplanes, dtype=complex_)
+    tiny = np.finfo(real).tiny  # avoids dividing by 0, a zero field stays zero
+
+    corrs = []
+    done = 0  # iterations
+    for i in range(iterations):
+        np.multiply(slm_in, unified_slm_field, out=fields)
+        target_fields = fft.fft2(fields)
+
+        np.abs(target_fields, out=magnitudes)
+        if use_correlations or (export and i == iterations - 1):
+            np.square(magnitudes, out=intensities)
+            if replace_middle:  # there's always a high intensity pixel in the middle from the fft
+                intensities[middle] = 0
+            corrs.append(correlations(intensities))
+
+        # keep the phase, with the target amplitude
+        magnitudes += tiny
+        np.divide(target_amplitudes, magnitudes, out=magnitudes)
+        target_fields *= magnitudes
+
+        slm_fields = fft.ifft2(target_fields)
+        np.abs(slm_fields, out=magnitudes)
+        magnitudes += tiny
+        slm_fields /= magnitudes
+        slm_fields *= slm_out
+
+        if use_correlations and i > 1:
+            c = corrs[-1] / corrs[-1].sum()
+            field_ratios += (target_ratios - c) / 2.
+        weights[:] = field_ratios
+        np.dot(weights, slm_fields.reshape(nplanes, -1), out=unified_slm_field.reshape(-1))
+        np.abs(unified_slm_field, out=unified_magnitude)
+        unified_magnitude += tiny
+        unified_slm_field /= unified_magnitude
+
+        done += 1
+        if converged(corrs, tolerance):
+            break
+
+    if corrs:
+        nr = corrs[-1]
+        print ("Targets: ", target_ratios, nr / nr.sum(), "after %d iterations" % done)
+    return GSFresult(np.angle(unified_slm_field) % (2 * pi), list(intensities) if export and done else None,
+                     correlations=corrs, algorithm='GS_3D_buffered', iterations=done)
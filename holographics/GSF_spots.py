@@ -0,0 +1,116 @@
+"""
+Software package for two-photon holographic optogenetics
+Copyright (C) 2014-2017  Joseph Donovan, Max Planck Institute of Neurobiology
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from __future__ import print_function, division
+import numpy as np
+from GSF import cached_lens, cis, GSFresult, converged, precisions
+
+pi = np.pi
+
+
+def spot_gratings(positions, shape):
+    """
+    Blazed gratings that move the zero order to each target pixel position (x, y) of the fftshifted far field
+    The gratings are separable, so they're kept as row and column factors instead of full arrays
+    :return: row factors (rows, nspots) and column factors (columns, nspots)
+    """
+    rows, columns = shape
+    fy = (positions[:, 1] - rows // 2) / rows  # cycles per SLM pixel
+    fx = (positions[:, 0] - columns // 2) / columns
+    return np.exp(2j * pi * np.outer(np.arange(rows), fy)), np.exp(2j * pi * np.outer(np.arange(columns), fx))
+
+
+def uniformity(intensities):
+    return 1 - (intensities.max() - intensities.min()) / (intensities.max() + intensities.min())
+
+
+def WGS_spots(positions, Zs, amplitudes, shape, wavelength=960, iterations=30, tolerance=None, initial_phase=None,
+              precision='single'):
+    """
+    Weighted GS for diffraction limited spots (Di Leonardo et al. 2007), starting from the superposition of a
+    grating and lens per spot. Only the fields at the spots are evaluated, no FFTs, so the cost is
+    O(pixels * spots) per iteration, done as matrix products of the separable gratings, one set per Z plane.
+    :param positions: (nspots, 2) spot centres (x, y) in pixels of the target, same coordinates as the rasters for GS_3D
+    :param Zs: Zlevel of each spot
+    :param amplitudes: target amplitude of each spot
+    :param shape: shape of the SLM phase
+    :param iterations: maximum number of iterations
+    :param tolerance: stop once the spot uniformity plateaus (see GSF.converged), None to always run all iterations
+    :param initial_phase: phase to start from, instead of the superposition with random spot phases
+    :param precision: 'single' or 'double', for the SLM sized arrays
+    :return: GSFresult, correlations holds the uniformity of the spot intensities for each iteration
+    """
+    positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+    Zs = np.asarray(Zs, dtype=float)
+    amplitudes = np.asarray(amplitudes, dtype=float)
+    assert len(positions) == len(Zs) == len(amplitudes) > 0
+    assert (amplitudes > 0).all(), "Spots need a positive amplitude"
+    real, complex_ = precisions[precision]
+
+    planes = []
+    for Z in np.unique(Zs):
+        idx = np.where(Zs == Z)[0]
+        rows, columns = [g.astype(complex_) for g in spot_gratings(positions[idx], shape)]
+        lens_exp = cached_lens(shape, Z, wavelength, complex_)[1]
+        planes.append((idx, rows, columns, lens_exp, lens_exp.conj()))
+
+    def slm_field(spot_fields):
+        """ Superposition of the gratings and lenses, weighted by the complex spot fields """
+        spot_fields = spot_fields.astype(complex_)
+        field = 0
+        for idx, rows, columns, lens_out, _ in planes:
+            field = field + lens_out * np.dot(rows * spot_fields[idx], columns.T)
+        return field
+
+    def phase_only(field):
+        """ exp(1j * angle(field)), without going through the angle """
+        magnitude = np.abs(field)
+        magnitude[magnitude == 0] = 1
+        field /= magnitude
+        return field
+
+    def spot_fields(field):
+        """ Field at each spot, for a phase only SLM field """
+        fields = np.empty(len(amplitudes), dtype=complex)
+        for idx, rows, columns, _, lens_in in planes:
+            fields[idx] = (np.dot(rows.conj().T, field * lens_in) * columns.conj().T).sum(1)
+        return fields / field.size
+
+    if initial_phase is None:
+        field = phase_only(slm_field(amplitudes * np.exp(2j * pi * np.random.rand(len(amplitudes)))))
+    else:
+        field = cis(initial_phase.astype(real))
+
+    weights = np.ones(len(amplitudes))
+    corrs = []
+    for i in range(iterations):
+        fields = spot_fields(field)
+        ratios = np.abs(fields) / amplitudes
+        corrs.append(uniformity(ratios ** 2))
+
+        weights *= ratios.mean() / ratios
+        weights /= weights.mean()
+        field = phase_only(slm_field(weights * amplitudes * np.exp(1j * np.angle(fields))))
+        if converged(corrs, tolerance):
+            break
+
+    if corrs:
+        efficiency = (np.abs(spot_fields(field)) ** 2).sum()
+        print("Spots: %d, uniformity %.3f, efficiency %.3f after %d iterations" % (len(amplitudes), corrs[-1],
+                                                                                   efficiency, len(corrs)))
+    return GSFresult(np.angle(field) % (2 * pi), correlations=corrs, algorithm='WGS_spots', iterations=len(corrs))
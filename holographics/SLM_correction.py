@@ -34,8 +34,10 @@ class SLM_correction(object):
         bmps = [f for f in os.listdir(deformation_corrections_path) if f.endswith('.bmp')]
         self.deformation_wavelengths = [int(re.search('\d{3,4}(?=nm\.bmp)', f).group()) for f in bmps]
 
+        # uint8 and contiguous, so adding them to the holograms wraps mod 256 without any casting
         self.deformation_corrections = dict(zip(self.deformation_wavelengths, [
-            misc.imread(os.path.join(deformation_corrections_path, f), flatten=True).T for f in bmps]))
+            np.ascontiguousarray(misc.imread(os.path.join(deformation_corrections_path, f), flatten=True).T,
+                                 dtype=np.uint8) for f in bmps]))
 
     def load_LUT_corrections(self, LUT_path):
         with open(LUT_path, 'rU') as LUT_file:
@@ -66,13 +68,29 @@ class SLM_correction(object):
         return self.deformation_corrections[wavelength]
 
     def apply_deformation_pattern(self, hologram, wavelength):
-        deformation_pattern = self.get_deformation_pattern(wavelength).astype('uint8')
+        deformation_pattern = self.get_deformation_pattern(wavelength)
         assert hologram.shape == deformation_pattern.shape
-        hologram = hologram.astype('uint16')
-        hologram += self.get_deformation_pattern(wavelength).astype('uint16')
-        res = hologram % 256
-
-        return res.astype('uint8')
+        return np.add(hologram, deformation_pattern, dtype=np.uint8)  # uint8 wraps around, mod 256
+
+    @staticmethod
+    def factor_table(correction_factor):
+        """
+        Lookup table of the correction factor for every 8 bit level, same as (level * factor).astype('uint8')
+        The levels are uint8 as the holograms are, so the product is done in the same precision as (holo * factor)
+        """
+        return (np.arange(256, dtype=np.uint8) * correction_factor).astype('uint8')
+
+    def correct(self, holograms, wavelength, correction_factor, out=None):
+        """
+        Deformation pattern, mod 256 wrap and correction factor for a whole stack of holograms (..., x, y), without
+        any temporary arrays: a wrapping uint8 add, then the factor as a lookup table
+        :param out: uint8 array for the result, can be holograms itself
+        """
+        holograms = np.asarray(holograms)
+        deformation_pattern = self.get_deformation_pattern(wavelength)
+        assert holograms.shape[-2:] == deformation_pattern.shape
+        out = np.add(holograms, deformation_pattern, out=out, dtype=np.uint8)
+        return np.take(self.factor_table(correction_factor), out, out=out, mode='clip')
 
     def get_LUT_correction(self, wavelength):
         return 255. / (293. * self.wavelength_LUT(wavelength))
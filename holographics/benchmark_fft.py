@@ -0,0 +1,57 @@
+"""
+Software package for two-photon holographic optogenetics
+Copyright (C) 2014-2017  Joseph Donovan, Max Planck Institute of Neurobiology
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from __future__ import print_function, division
+import time
+
+import numpy as np
+
+import fft_backend
+from GSF import precisions
+from frame import compute_size
+
+
+def time_backend(backend, shape, dtype=np.complex64, repeats=10):
+    """ Average time for a forward plus inverse transform pair, after one warmup (planning) call """
+    a = (np.random.rand(*shape) * np.exp(1j * np.random.rand(*shape))).astype(dtype)
+    backend.ifft2(backend.fft2(a))
+    t1 = time.time()
+    for i in range(repeats):
+        backend.ifft2(backend.fft2(a))
+    return (time.time() - t1) / repeats
+
+
+def benchmark(threads=(1, 4), nplanes=(1, 6, 10), precision=('single', 'double')):
+    """ Transforms as the solver runs them: stacks of raster sized planes, in the solver precision(s) ([gsf]) """
+    print("%-8s %8s %8s %10s %12s" % ('backend', 'threads', 'nplanes', 'precision', 'ms/pair'))
+    for name in sorted(fft_backend.backends):
+        for nthreads in threads:
+            try:
+                backend = fft_backend.get_backend(name, nthreads)
+            except ImportError:
+                print("%-8s not available" % name)
+                break
+            for n in nplanes:
+                shape = (n, compute_size[1], compute_size[0])
+                for p in precision:
+                    seconds = time_backend(backend, shape, precisions[p][1])
+                    print("%-8s %8d %8d %10s %12.1f" % (name, nthreads, n, p, 1000 * seconds))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -271,6 +271,21 @@ class XYCalibrator(Calibrator):
                 return svg
             return svg_util.insertTransform(svg, self.transformation_matrix)
 
+    def apply_spots(self, spots, transform=None):
+        """
+        Same calibration as apply, for a table of spots (x, y, radius, weight), as vector math instead of an svg
+        transform.  Spots stay circular, the radius is scaled by the mean scale of the transform.
+        """
+        if transform is None:
+            transform = self.transformation_matrix
+            if transform is None:
+                print("Can't apply XYCalibration, not calibrated yet!")
+                return spots
+        spots = np.array(spots, dtype=float).reshape(-1, 4)
+        spots[:, :2] = np.dot(spots[:, :2], transform[:2, :2].T) + transform[:2, 2]
+        spots[:, 2] *= abs(np.linalg.det(transform[:2, :2])) ** .5
+        return spots
+
 
 class ZCalibrator(Calibrator):
     def __init__(self, *args, **kwargs):
@@ -16,10 +16,9 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-import os
-from joblib import Memory
-from holographics.frame_computation import cachedir
+from __future__ import print_function
+from holographics.frame_computation import cache
 
-if not os.path.exists(cachedir):
-    os.mkdir(cachedir)
-memory = Memory(cachedir=cachedir, verbose=0)
+if __name__ == '__main__':
+    print("Removing %.1f MB of cached holograms from %s" % (cache.size_mb(), cache.cachedir))
+    cache.clear()
@@ -0,0 +1,168 @@
+"""
+Software package for two-photon holographic optogenetics
+Copyright (C) 2014-2017  Joseph Donovan, Max Planck Institute of Neurobiology
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from __future__ import print_function, division
+import os
+import pickle
+import tempfile
+
+import numpy as np
+
+wisdom_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fftw_wisdom.pkl')  # not the working directory
+
+
+class NumpyFFT(object):
+    """
+    Plain numpy.fft, no planning and single threaded
+    All backends transform over the last two axes, so stacks of planes (nplanes, N, N) can be passed in directly
+    All backends keep single precision input in single precision (numpy.fft itself always computes in double)
+    """
+    name = 'numpy'
+
+    def __init__(self, threads=1):
+        self.threads = threads
+
+    def fft2(self, a):
+        return np.fft.fft2(a, axes=(-2, -1)).astype(np.result_type(a, np.complex64), copy=False)
+
+    def ifft2(self, a):
+        return np.fft.ifft2(a, axes=(-2, -1)).astype(np.result_type(a, np.complex64), copy=False)
+
+
+class ScipyFFT(object):
+    """
+    scipy.fft (scipy >= 1.4), multi-threaded with workers=, plans are cached internally by pocketfft
+    """
+    name = 'scipy'
+
+    def __init__(self, threads=1):
+        import scipy.fft
+        self.scipy_fft = scipy.fft
+        self.threads = threads
+
+    def fft2(self, a):
+        return self.scipy_fft.fft2(a, axes=(-2, -1), workers=self.threads)
+
+    def ifft2(self, a):
+        return self.scipy_fft.ifft2(a, axes=(-2, -1), workers=self.threads)
+
+
+class PyFFTW(object):
+    """
+    pyFFTW with one plan per (direction, shape, dtype), kept for the lifetime of the backend
+    Wisdom is loaded from and saved to wisdom_path, so the (slow) FFTW_MEASURE planning is only paid once per machine
+    It's saved after the warm up (see frame_computation.warm_up_fft), not for every plan
+    The returned array is owned by the plan and is overwritten by the next transform of the same shape - copy if needed
+    """
+    name = 'pyfftw'
+
+    def __init__(self, threads=1, planner_effort='FFTW_MEASURE'):
+        import pyfftw
+        self.pyfftw = pyfftw
+        self.threads = threads
+        self.planner_effort = planner_effort
+        self.plans = {}
+        self.new_plans = False  # since the wisdom was saved
+        self.load_wisdom()
+
+    def load_wisdom(self):
+        if os.path.exists(wisdom_path):
+            try:
+                with open(wisdom_path, 'rb') as f:
+                    self.pyfftw.import_wisdom(pickle.load(f))
+            except Exception as e:
+                print("Couldn't load FFTW wisdom: ", e)
+
+    def save_wisdom(self):
+        """
+        Written to a temporary file and renamed, as the compute workers all save it at the same time, so no process
+        ever reads a partial file
+        """
+        if not self.new_plans:
+            return
+        fd, temppath = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(wisdom_path))
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(self.pyfftw.export_wisdom(), f)
+        try:
+            os.rename(temppath, wisdom_path)
+        except OSError:  # windows doesn't allow renaming over an existing file
+            try:
+                os.remove(wisdom_path)
+                os.rename(temppath, wisdom_path)
+            except OSError:  # another process is replacing it right now
+                os.remove(temppath)
+                return
+        self.new_plans = False
+
+    def plan(self, direction, shape, dtype):
+        key = (direction, shape, dtype)
+        if key not in self.plans:
+            builder = self.pyfftw.builders.fft2 if direction == 'forward' else self.pyfftw.builders.ifft2
+            a = self.pyfftw.empty_aligned(shape, dtype=dtype)
+            self.plans[key] = builder(a, axes=(-2, -1), threads=self.threads, planner_effort=self.planner_effort,
+                                      avoid_copy=False)
+            self.new_plans = True
+        return self.plans[key]
+
+    def fft2(self, a):
+        a = np.asarray(a, dtype=np.result_type(a, np.complex64))
+        return self.plan('forward', a.shape, a.dtype)(a)
+
+    def ifft2(self, a):
+        a = np.asarray(a, dtype=np.result_type(a, np.complex64))
+        return self.plan('inverse', a.shape, a.dtype)(a)
+
+
+backends = {NumpyFFT.name: NumpyFFT, ScipyFFT.name: ScipyFFT, PyFFTW.name: PyFFTW}
+_instances = {}
+_current = (NumpyFFT.name, 1)
+
+
+def get_backend(name=None, threads=None):
+    """
+    Returns the (shared) backend instance, by default the one selected with set_backend
+    Instances are kept, so plans are reused across iterations and across requests
+    """
+    name = _current[0] if name is None else name
+    threads = _current[1] if threads is None else threads
+    if (name, threads) not in _instances:
+        _instances[(name, threads)] = backends[name](threads)
+    return _instances[(name, threads)]
+
+
+def set_backend(name, threads=1):
+    """
+    Selects the FFT backend used by the GS algorithms, falls back to numpy if the library isn't available
+    """
+    global _current
+    if name not in backends:
+        raise ValueError("Unknown FFT backend '%s', choose from %s" % (name, ', '.join(sorted(backends))))
+    try:
+        get_backend(name, threads)
+    except ImportError as e:
+        print("FFT backend %s not available (%s), using numpy instead" % (name, e))
+        name = NumpyFFT.name
+    _current = (name, threads)
+    print("Using FFT backend %s with %d threads" % (name, threads))
+    return get_backend()
+
+
+def set_backend_from_config(config):
+    """ Reads the optional [fft] section of holo_config.cfg """
+    if config.has_section('fft'):
+        set_backend(config.get('fft', 'backend'), int(config.get('fft', 'threads')))
@@ -17,23 +17,31 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 import copy
+from collections import OrderedDict
 
 import numpy as np
 from PIL import Image
 
 import svg_util
-from svg_util import add_background, svg_to_np, set_svg_bounds
+from hologram_cache import raster_digest
+from svg_util import add_background, svg_to_np, set_svg_bounds, circles_to_np, parse_svg, ET
 
 compute_size = (792, 792)
 
-target_size = (792, 600)
+target_size = (792, 600)  # SLM, rasters of this size are solved directly instead of cropping a compute_size solve
 svg_target_size_x = 400  # um
 svg_target_size_y = int(svg_target_size_x * float(compute_size[0]) / compute_size[1])
+svg_viewbox = (-svg_target_size_x / 2, -svg_target_size_y / 2, svg_target_size_x, svg_target_size_y)
+
+# most recently rasterized svgs (after calibration and bounding), so repeated patterns aren't rendered again
+raster_cache = OrderedDict()
+raster_cache_items = 64
 
 
 class Frame(object):
-    def __init__(self, svg=None, raster=None, holograms=None, Zlevel=0, frame_num=None, duration=0):
+    def __init__(self, svg=None, raster=None, holograms=None, Zlevel=0, frame_num=None, duration=0, spots=None):
         self.svg = svg
+        self.spots = spots  # instead of an svg: rows of (x, y, radius, weight) in um, see svg_util.spots_to_shapes
         self.raster = raster
         self.Zlevel = Zlevel
         self.frame_num = frame_num
@@ -41,13 +49,78 @@ class Frame(object):
         self.holograms = holograms
         self.computedpattern = None
 
+    @property
+    def svg(self):
+        """ svg string, serialized from the parsed svg only when it's needed """
+        if self._svg is None and self._svg_tree is not None:
+            self._svg = ET.tostring(self._svg_tree)
+        return self._svg
+
+    @svg.setter
+    def svg(self, svg):
+        """ svg string, or parsed svg (ie changed in place, from svg_tree) """
+        if ET.iselement(svg):
+            self._svg, self._svg_tree = None, svg
+        else:
+            self._svg, self._svg_tree = svg, None
+
+    def svg_tree(self):
+        """
+        Parsed svg, parsed only once, so calibration, bounds and background all work on the same tree
+        After changing it in place, set it back (frame.svg = tree) so the string is serialized again
+        """
+        if self._svg_tree is None and self._svg:
+            self._svg_tree = parse_svg(self._svg)
+        return self._svg_tree
+
+    @property
+    def raster(self):
+        return self._raster
+
+    @raster.setter
+    def raster(self, raster):
+        self._raster = raster
+        self._raster_digest = None
+
+    def raster_digest(self):
+        """ Digest of the raster, used as cache key, computed only once per raster """
+        if self._raster_digest is None:
+            self._raster_digest = raster_digest(self._raster)
+        return self._raster_digest
+
     def rasterize(self):
+        if self.spots is not None:  # no svg, drawn directly
+            raster = svg_util.shapes_to_np(self.pixel_shapes(), (compute_size[1], compute_size[0]))
+            raster.flags.writeable = False
+            self.raster = raster
+            return
+
         assert self.svg
         self.set_svg_bounds()
-        dpi = (72 * svg_target_size_x / float(compute_size[0]))
-        raster = svg_to_np(self.svg, dpi)
-        assert np.diff(raster[:, :, :3]).sum() == 0, 'All svg color channels should be the same'
-        self.raster = raster[:, :, 0]
+
+        raster = raster_cache.pop(self.svg, None)  # the one time the svg is serialized
+        if raster is None:
+            raster = circles_to_np(self.svg_tree(), (compute_size[1], compute_size[0]))  # fast path for simple circles
+        if raster is None:
+            dpi = (72 * svg_target_size_x / float(compute_size[0]))
+            raster = np.ascontiguousarray(svg_to_np(self.svg, dpi))  # copy, so the cairo buffer isn't kept alive
+        raster.flags.writeable = False
+
+        raster_cache[self.svg] = raster
+        while len(raster_cache) > raster_cache_items:
+            raster_cache.popitem(last=False)
+        self.raster = raster
+
+    def pixel_shapes(self, shape=None):
+        """
+        Circles/ellipses of the frame in pixels of the given shape (the raster by default), see svg_util.pixel_shapes
+        None if the svg isn't only circles and ellipses
+        """
+        if shape is None:
+            shape = (compute_size[1], compute_size[0])
+        if self.spots is not None:
+            return svg_util.spots_to_shapes(self.spots, svg_viewbox, shape)
+        return svg_util.pixel_shapes(self.svg_tree(), shape) if self.svg_tree() is not None else None
 
     def apply_deformation_correction(self, SLM_correction, *args, **kwargs):
         self.holograms = [SLM_correction.apply_deformation_pattern(holo, *args, **kwargs) for holo in self.holograms]
@@ -78,7 +151,11 @@ class Frame(object):
     def copy(self):
         return copy.deepcopy(self)
 
+    def solver_copy(self):
+        """ Copy with only what the solver needs, the raster (shared) and Zlevel, ie to send to the compute pool """
+        frame = Frame(raster=self.raster, Zlevel=self.Zlevel)
+        frame._raster_digest = self._raster_digest
+        return frame
+
     def set_svg_bounds(self):
-        self.svg = add_background(
-            set_svg_bounds(self.svg, -svg_target_size_x / 2, -svg_target_size_y / 2, svg_target_size_x,
-                           svg_target_size_y))
+        self.svg = add_background(set_svg_bounds(self.svg_tree(), *svg_viewbox))
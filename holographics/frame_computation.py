@@ -17,55 +17,216 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 import math
-import os
+import time
 
 import numpy as np
 import scipy.ndimage
-from holographics import svg_util
-from holographics.GSF_3D import GS_3D as GS
+from holographics import GSF, fft_backend, svg_util
+from holographics.GSF import zernike_basis
+from holographics.GSF_3D import GS_3D_buffered as GS
+from holographics.GSF_spots import WGS_spots
 from holographics.frame import Frame, target_size, compute_size, svg_target_size_x, svg_target_size_y
-from joblib import Memory
-from scipy.misc import imresize
+from holographics.hologram_cache import HologramCache, WarmStarts, request_key
 from diffraction_efficiency import diff3d as diffractioneff3d
 
 cachedir = './gsf_cache'
-memory = Memory(cachedir=cachedir, verbose=0)
-
-if not os.path.exists(cachedir):
-    os.mkdir(cachedir)
-memory.clear()
+cache = HologramCache(cachedir)
+warm_starts = WarmStarts()
+zernike_basis((compute_size[1], compute_size[0]))  # the lens basis for the raster size is only computed once, here
 
 
 def computehologram(frames, wavelength, *args, **kwargs):
-    target_amplitudes, Zs = zip(*[[f.raster, f.Zlevel] for f in frames])
+    """
+    :param algorithm: (keyword) name of the AlgorithmTypes value, GLS (default) or WGS_SPOTS
+    :param spots: (keyword) frame_spots of the frames, if already known (the pool only gets rasters, see submitgroup)
+    :return: the SLM hologram, and the solver phase (full compute size, for warm starts)
+    """
+    algorithm = kwargs.pop('algorithm', 'GLS')
+    spots = kwargs.pop('spots', None)
 
     # drop blank frames, if all are blank, use a large blank circle
-    non_blank = [(t, Z) for t, Z in zip(target_amplitudes, Zs) if t.sum() != 0]
-    if non_blank:
-        target_amplitudes, Zs = zip(*non_blank)
-    else:
+    frames = [f for f in frames if f.raster.sum() != 0]
+    if not frames:
         print('Frames blank, showing default large circle')
         f = Frame(svg=svg_util.generate_circle_svg(0, 0, 80))
         f.rasterize()
-        target_amplitudes = [f.raster]
-        Zs = [0]
+        frames = [f]
 
-    res = GS(target_amplitudes, Zs, wavelength, *args, **kwargs)
+    res = None
+    if algorithm == 'WGS_SPOTS':
+        if spots is None:
+            spots = frame_spots(frames)
+        if spots is None:
+            print('Frames are not only circles, using GS instead of spots')
+        else:
+            res = WGS_spots(*spots, shape=frames[0].raster.shape, wavelength=wavelength, **kwargs)
+    if res is None:
+        res = GS([f.raster for f in frames], [f.Zlevel for f in frames], wavelength, *args, **kwargs)
 
-    hologram = (res.phase % (2 * math.pi)) * 255 / (2 * math.pi)
+    return phase_to_slm(res.phase), res.phase.astype(np.float32)
 
-    # resize to match the SLM size
-    resized = imresize(hologram, (max(target_size),) * 2)
-    resized = resized[:, resized.shape[1] / 2 - target_size[1] / 2:resized.shape[1] / 2 + target_size[1] / 2].astype(
-        'uint8')
-    return (resized)
+
+def phase_to_slm(phase):
+    """
+    8 bit SLM hologram from a solved phase, 0-2pi mapping to 0-255 (no rescaling by the phase range)
+    The middle of the solve is kept where it's larger than the SLM, a solve at the SLM size (raster of target_size)
+    is used as is
+    """
+    offsets = [(n - t) // 2 for n, t in zip(phase.shape, target_size)]
+    assert min(offsets) >= 0, "Solved phase %s is smaller than the SLM %s" % (phase.shape, target_size)
+    phase = phase[offsets[0]:offsets[0] + target_size[0], offsets[1]:offsets[1] + target_size[1]]
+    return np.ascontiguousarray(np.rint((phase % (2 * math.pi)) * (255 / (2 * math.pi))), dtype=np.uint8)
 
 
-def computemultipatternhologram(frames, wavelength, *args, **kwargs):
-    holo = memory.cache(computehologram)(frames, wavelength, *args, **kwargs)
+def frame_spots(frames):
+    """
+    Spots for WGS_spots, from frames made only of circles (or given as spots)
+    The power of each spot is summed from the raster, so the diffraction efficiency correction and the intensity
+    scaling are the same as for GS
+    :return: positions (x, y in raster pixels), Zs and amplitudes of the spots, or None if a frame isn't only circles
+    """
+    positions, Zs, amplitudes = [], [], []
+    for f in frames:
+        shapes = f.pixel_shapes(f.raster.shape)
+        if shapes is None:
+            return None
+        for x, y, r, _ in svg_util.shapes_to_spots(shapes):
+            y0, y1 = max(int(y - r) - 1, 0), min(int(y + r) + 2, f.raster.shape[0])
+            x0, x1 = max(int(x - r) - 1, 0), min(int(x + r) + 2, f.raster.shape[1])
+            yy, xx = np.ogrid[y0:y1, x0:x1]
+            intensity = f.raster[y0:y1, x0:x1][(xx - x) ** 2 + (yy - y) ** 2 <= (r + 1) ** 2].sum(dtype=float)
+            if intensity > 0:  # outside the field of view
+                positions.append((x, y))
+                Zs.append(f.Zlevel)
+                amplitudes.append(intensity ** .5)
+    if not positions:
+        return None
+    return np.array(positions), np.array(Zs), np.array(amplitudes)
+
+
+def hologram_request(frames, wavelength, iterations=30, **kwargs):
+    return request_key(frames, wavelength, iterations=iterations, **kwargs)
+
+
+def computemultipatternhologram(frames, wavelength, iterations=30, **kwargs):
+    request = hologram_request(frames, wavelength, iterations=iterations, **kwargs)
+    holo = cache.get(request)
+    if holo is None:
+        holo, _ = computehologram(frames, wavelength, iterations=iterations, **kwargs)
+        cache.put(request, holo)
     return [holo]
 
 
+def computegroup(args):
+    """
+    Computes and caches the holograms for a group missing from the cache, in the pool or in this process
+    :param args: frames, wavelength, solver kwargs (part of the cache key), the initial phase (or None) and the
+    frame_spots (or None)
+    :return: the holograms, the solver phase and the solve time
+    """
+    frames, wavelength, kwargs, initial_phase, spots = args
+    t = time.time()
+    holo, phase = computehologram(frames, wavelength, initial_phase=initial_phase, spots=spots, **kwargs)
+    cache.put(hologram_request(frames, wavelength, **kwargs), holo)
+    return [holo], phase, time.time() - t
+
+
+class ComputedHolograms(object):
+    """ Holograms that are already available (cache hit or computed in this process), same interface as PendingHolograms """
+
+    def __init__(self, holos, solve_time=0.):
+        self.holos = holos
+        self.solve_time = solve_time
+
+    def ready(self):
+        return True
+
+    def get(self):
+        return self.holos, self.solve_time
+
+
+class PendingHolograms(object):
+    """
+    Holograms being computed in the pool
+    Once collected, the result is added to the in memory cache and the solver phase to the warm starts
+    """
+
+    def __init__(self, request, async_result, frames, wavelength):
+        self.request = request
+        self.async_result = async_result
+        self.frames = frames
+        self.wavelength = wavelength
+
+    def ready(self):
+        return self.async_result.ready()
+
+    def get(self):
+        holos, phase, solve_time = self.async_result.get()
+        cache.remember(self.request, holos[0])  # already stored on disk by the worker
+        warm_starts.add(self.request, self.frames, self.wavelength, phase)
+        return holos, solve_time
+
+
+def submitgroup(frames, wavelength, pool=None, **kwargs):
+    """
+    Starts the computation of the holograms for one group of contemporaneous frames
+    Cache hits, and everything when there's no pool, are computed right away
+    Misses start from the phase of the most similar recent solution, if there is one
+    Only the rasters and Zlevels are sent to the pool (the spots are found here, from the svgs, for WGS_SPOTS)
+    :return: ComputedHolograms or PendingHolograms, get() returns the holograms and the solve time
+    """
+    request = hologram_request(frames, wavelength, **kwargs)
+    holo = cache.get(request)
+    if holo is not None:
+        return ComputedHolograms([holo])
+    spots = None
+    if kwargs.get('algorithm') == 'WGS_SPOTS':
+        spots = frame_spots([f for f in frames if f.raster.any()])  # blank frames are dropped by computehologram
+    args = ([f.solver_copy() for f in frames], wavelength, kwargs, warm_starts.nearest(frames, wavelength), spots)
+    if pool is None:
+        holos, phase, solve_time = computegroup(args)
+        warm_starts.add(request, frames, wavelength, phase)
+        return ComputedHolograms(holos, solve_time)
+    return PendingHolograms(request, pool.apply_async(computegroup, (args,)), frames, wavelength)
+
+
+def computemultipatternholograms(frame_groups, wavelength, pool=None, idle=None, **kwargs):
+    """
+    Computes the holograms for a list of frame groups (each group being contemporaneous frames)
+    Cache hits are served from this process, the remaining groups are computed concurrently in the pool if one is given
+    :param idle: called repeatedly while waiting for the pool (ie gevent.sleep), so the caller can do other work
+    """
+    results = [submitgroup(frames, wavelength, pool=pool, **kwargs) for frames in frame_groups]
+    while idle is not None and not all(r.ready() for r in results):
+        idle()
+    return [r.get()[0] for r in results]
+
+
+def warm_up_fft(precision='single', max_planes=1):
+    """
+    Makes the FFT plans the solver uses, for stacks of 1 to max_planes raster sized planes in the given precision,
+    instead of during the first requests
+    """
+    fft = fft_backend.get_backend()
+    complex_ = GSF.precisions[precision][1]
+    for nplanes in range(1, max_planes + 1):
+        fft.ifft2(fft.fft2(np.zeros((nplanes, compute_size[1], compute_size[0]), dtype=complex_)))
+    if hasattr(fft, 'save_wisdom'):
+        fft.save_wisdom()
+
+
+def init_worker(fft_backend_name, fft_threads, cache_max_size_mb, lens_cache_max_mb, precision='single',
+                max_planes=1):
+    """
+    Runs once in each process of the compute pool, when the pool is started
+    Everything is imported and the FFT plans are made here (see warm_up_fft), instead of during the first request
+    """
+    fft_backend.set_backend(fft_backend_name, fft_threads)
+    cache.max_size_mb = cache_max_size_mb
+    GSF.lens_cache_max_mb = lens_cache_max_mb
+    warm_up_fft(precision, max_planes)
+
+
 def simple_generate_frames(frames):
     """
     Only for testing purposes
@@ -18,7 +18,7 @@ _sym_db = _symbol_database.Default()
 DESCRIPTOR = _descriptor.FileDescriptor(
   name='holo_msg.proto',
   package='holo',
-  serialized_pb=_b('\n\x0eholo_msg.proto\x12\x04holo\"\x85\x05\n\x0fStandardCommand\x12+\n\x03\x63md\x18\x01 \x02(\x0e\x32\x1e.holo.StandardCommand.CmdTypes\x12#\n\nimage_meta\x18\x02 \x03(\x0b\x32\x0f.holo.ImageMeta\x12\x0f\n\x07message\x18\x03 \x01(\t\x12\x12\n\nwavelength\x18\x04 \x01(\x02\x12<\n\talgorithm\x18\x05 \x01(\x0e\x32$.holo.StandardCommand.AlgorithmTypes:\x03GLS\x12\x18\n\x0c\x65xtraZlevels\x18\x06 \x03(\x01\x42\x02\x10\x01\x12\x1c\n\x14\x63\x61libration_circle_x\x18\x07 \x01(\x02\x12\x1c\n\x14\x63\x61libration_circle_y\x18\x08 \x01(\x02\x12\x1b\n\x13\x63\x61libration_Z_level\x18\t \x01(\x02\x12\x19\n\x11\x63orrection_factor\x18\n \x01(\x02\x12\x17\n\x0fobjectiveZlevel\x18\x0b \x01(\x02\"\xfa\x01\n\x08\x43mdTypes\x12\n\n\x06STATUS\x10\x00\x12\x0c\n\x08GENERATE\x10\x01\x12\x08\n\x04PLAY\x10\x02\x12\x11\n\rCALIBRATE_RUN\x10\x03\x12\x18\n\x14\x43\x41LIBRATE_BACKGROUND\x10\x04\x12\x14\n\x10\x43\x41LIBRATE_CIRCLE\x10\x05\x12\x0f\n\x0b\x43\x41LIBRATE_Z\x10\x06\x12\x13\n\x0f\x43\x41LIBRATE_Z_RUN\x10\x07\x12\x1f\n\x1b\x43\x41LIBRATE_CORRECTION_FACTOR\x10\x08\x12\x14\n\x10\x43\x41LIBRATE_TIMING\x10\t\x12\x15\n\x11\x43\x41LIBRATE_RELEASE\x10\n\x12\x13\n\x0f\x43\x41LIBRATE_Z_OBJ\x10\x0b\"\x19\n\x0e\x41lgorithmTypes\x12\x07\n\x03GLS\x10\x00\"\xd1\x02\n\rStandardReply\x12-\n\x05reply\x18\x01 \x02(\x0e\x32\x1e.holo.StandardReply.ReplyTypes\x12#\n\nimage_meta\x18\x02 \x03(\x0b\x32\x0f.holo.ImageMeta\x12-\n\x05\x65rror\x18\x03 \x01(\x0e\x32\x1e.holo.StandardReply.ErrorTypes\x12\x15\n\rerror_message\x18\x04 \x01(\t\x12$\n\x1c\x63\x61librated_correction_factor\x18\x05 \x01(\x02\"\x1f\n\nReplyTypes\x12\x06\n\x02OK\x10\x00\x12\t\n\x05\x45RROR\x10\x01\"_\n\nErrorTypes\x12\x0b\n\x07UNKNOWN\x10\x00\x12\x0c\n\x08HARDWARE\x10\x01\x12\x0c\n\x08SOFTWARE\x10\x02\x12\x0f\n\x0b\x42\x41\x44_REQUEST\x10\x03\x12\x17\n\x13NOT_YET_IMPLEMENTED\x10\x04\"@\n\tImageMeta\x12\x0e\n\x06Zlevel\x18\x01 \x02(\x01\x12\x11\n\tframe_num\x18\x02 \x02(\x05\x12\x10\n\x08\x64uration\x18\x04 \x02(\x01')
+  serialized_pb=_b('\n\x0eholo_msg.proto\x12\x04holo\"\xc8\x06\n\x0fStandardCommand\x12+\n\x03\x63md\x18\x01 \x02(\x0e\x32\x1e.holo.StandardCommand.CmdTypes\x12#\n\nimage_meta\x18\x02 \x03(\x0b\x32\x0f.holo.ImageMeta\x12\x0f\n\x07message\x18\x03 \x01(\t\x12\x12\n\nwavelength\x18\x04 \x01(\x02\x12<\n\talgorithm\x18\x05 \x01(\x0e\x32$.holo.StandardCommand.AlgorithmTypes:\x03GLS\x12\x18\n\x0c\x65xtraZlevels\x18\x06 \x03(\x01\x42\x02\x10\x01\x12\x1c\n\x14\x63\x61libration_circle_x\x18\x07 \x01(\x02\x12\x1c\n\x14\x63\x61libration_circle_y\x18\x08 \x01(\x02\x12\x1b\n\x13\x63\x61libration_Z_level\x18\t \x01(\x02\x12\x19\n\x11\x63orrection_factor\x18\n \x01(\x02\x12\x17\n\x0fobjectiveZlevel\x18\x0b \x01(\x02\x12\x12\n\x04wait\x18\x0c \x01(\x08:\x04true\x12\x15\n\x06stream\x18\r \x01(\x08:\x05\x66\x61lse\x12\x16\n\x0emax_iterations\x18\x0e \x01(\r\x12\x11\n\ttolerance\x18\x0f \x01(\x02\x12\x15\n\rsequence_name\x18\x10 \x01(\t\x12\x1d\n\x05spots\x18\x11 \x03(\x0b\x32\x0e.holo.SpotList\"\xa2\x02\n\x08\x43mdTypes\x12\n\n\x06STATUS\x10\x00\x12\x0c\n\x08GENERATE\x10\x01\x12\x08\n\x04PLAY\x10\x02\x12\x11\n\rCALIBRATE_RUN\x10\x03\x12\x18\n\x14\x43\x41LIBRATE_BACKGROUND\x10\x04\x12\x14\n\x10\x43\x41LIBRATE_CIRCLE\x10\x05\x12\x0f\n\x0b\x43\x41LIBRATE_Z\x10\x06\x12\x13\n\x0f\x43\x41LIBRATE_Z_RUN\x10\x07\x12\x1f\n\x1b\x43\x41LIBRATE_CORRECTION_FACTOR\x10\x08\x12\x14\n\x10\x43\x41LIBRATE_TIMING\x10\t\x12\x15\n\x11\x43\x41LIBRATE_RELEASE\x10\n\x12\x13\n\x0f\x43\x41LIBRATE_Z_OBJ\x10\x0b\x12\x0f\n\x0b\x43LEAR_CACHE\x10\x0c\x12\x08\n\x04STOP\x10\r\x12\x0b\n\x07\x43ORRECT\x10\x0e\"(\n\x0e\x41lgorithmTypes\x12\x07\n\x03GLS\x10\x00\x12\r\n\tWGS_SPOTS\x10\x01\"\xfa\x03\n\rStandardReply\x12-\n\x05reply\x18\x01 \x02(\x0e\x32\x1e.holo.StandardReply.ReplyTypes\x12#\n\nimage_meta\x18\x02 \x03(\x0b\x32\x0f.holo.ImageMeta\x12-\n\x05\x65rror\x18\x03 \x01(\x0e\x32\x1e.holo.StandardReply.ErrorTypes\x12\x15\n\rerror_message\x18\x04 \x01(\t\x12$\n\x1c\x63\x61librated_correction_factor\x18\x05 \x01(\x02\x12\x18\n\x0c\x66rame_onsets\x18\x06 \x03(\x01\x42\x02\x10\x01\x12\x1f\n\x13\x66rame_timing_errors\x18\x07 \x03(\x01\x42\x02\x10\x01\x12\x0f\n\x07playing\x18\x08 \x01(\x08\x12\'\n\x0cstage_timing\x18\t \x03(\x0b\x32\x11.holo.StageTiming\x12\x18\n\x10\x66irst_frame_time\x18\n \x01(\x01\x12\x18\n\x0c\x66rames_ready\x18\x0b \x03(\x08\x42\x02\x10\x01\"\x1f\n\nReplyTypes\x12\x06\n\x02OK\x10\x00\x12\t\n\x05\x45RROR\x10\x01\"_\n\nErrorTypes\x12\x0b\n\x07UNKNOWN\x10\x00\x12\x0c\n\x08HARDWARE\x10\x01\x12\x0c\n\x08SOFTWARE\x10\x02\x12\x0f\n\x0b\x42\x41\x44_REQUEST\x10\x03\x12\x17\n\x13NOT_YET_IMPLEMENTED\x10\x04\"-\n\x0bStageTiming\x12\r\n\x05stage\x18\x01 \x02(\t\x12\x0f\n\x07seconds\x18\x02 \x02(\x01\"\x84\x01\n\x08SpotList\x12\x11\n\tframe_num\x18\x01 \x02(\x05\x12\x10\n\x08\x64uration\x18\x02 \x02(\x01\x12\r\n\x01x\x18\x03 \x03(\x02\x42\x02\x10\x01\x12\r\n\x01y\x18\x04 \x03(\x02\x42\x02\x10\x01\x12\r\n\x01z\x18\x05 \x03(\x02\x42\x02\x10\x01\x12\x12\n\x06radius\x18\x06 \x03(\x02\x42\x02\x10\x01\x12\x12\n\x06weight\x18\x07 \x03(\x02\x42\x02\x10\x01\"@\n\tImageMeta\x12\x0e\n\x06Zlevel\x18\x01 \x02(\x01\x12\x11\n\tframe_num\x18\x02 \x02(\x05\x12\x10\n\x08\x64uration\x18\x04 \x02(\x01')
 )
 _sym_db.RegisterFileDescriptor(DESCRIPTOR)
 
@@ -78,11 +78,23 @@ _STANDARDCOMMAND_CMDTYPES = _descriptor.EnumDescriptor(
       name='CALIBRATE_Z_OBJ', index=11, number=11,
       options=None,
       type=None),
+    _descriptor.EnumValueDescriptor(
+      name='CLEAR_CACHE', index=12, number=12,
+      options=None,
+      type=None),
+    _descriptor.EnumValueDescriptor(
+      name='STOP', index=13, number=13,
+      options=None,
+      type=None),
+    _descriptor.EnumValueDescriptor(
+      name='CORRECT', index=14, number=14,
+      options=None,
+      type=None),
   ],
   containing_type=None,
   options=None,
-  serialized_start=393,
-  serialized_end=643,
+  serialized_start=533,
+  serialized_end=823,
 )
 _sym_db.RegisterEnumDescriptor(_STANDARDCOMMAND_CMDTYPES)
 
@@ -96,11 +108,15 @@ _STANDARDCOMMAND_ALGORITHMTYPES = _descriptor.EnumDescriptor(
       name='GLS', index=0, number=0,
       options=None,
       type=None),
+    _descriptor.EnumValueDescriptor(
+      name='WGS_SPOTS', index=1, number=1,
+      options=None,
+      type=None),
   ],
   containing_type=None,
   options=None,
-  serialized_start=645,
-  serialized_end=670,
+  serialized_start=825,
+  serialized_end=865,
 )
 _sym_db.RegisterEnumDescriptor(_STANDARDCOMMAND_ALGORITHMTYPES)
 
@@ -121,8 +137,8 @@ _STANDARDREPLY_REPLYTYPES = _descriptor.EnumDescriptor(
   ],
   containing_type=None,
   options=None,
-  serialized_start=882,
-  serialized_end=913,
+  serialized_start=1246,
+  serialized_end=1277,
 )
 _sym_db.RegisterEnumDescriptor(_STANDARDREPLY_REPLYTYPES)
 
@@ -155,8 +171,8 @@ _STANDARDREPLY_ERRORTYPES = _descriptor.EnumDescriptor(
   ],
   containing_type=None,
   options=None,
-  serialized_start=915,
-  serialized_end=1010,
+  serialized_start=1279,
+  serialized_end=1374,
 )
 _sym_db.RegisterEnumDescriptor(_STANDARDREPLY_ERRORTYPES)
 
@@ -245,6 +261,48 @@ _STANDARDCOMMAND = _descriptor.Descriptor(
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       options=None),
+    _descriptor.FieldDescriptor(
+      name='wait', full_name='holo.StandardCommand.wait', index=11,
+      number=12, type=8, cpp_type=7, label=1,
+      has_default_value=True, default_value=True,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='stream', full_name='holo.StandardCommand.stream', index=12,
+      number=13, type=8, cpp_type=7, label=1,
+      has_default_value=True, default_value=False,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='max_iterations', full_name='holo.StandardCommand.max_iterations', index=13,
+      number=14, type=13, cpp_type=3, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='tolerance', full_name='holo.StandardCommand.tolerance', index=14,
+      number=15, type=2, cpp_type=6, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='sequence_name', full_name='holo.StandardCommand.sequence_name', index=15,
+      number=16, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b("").decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='spots', full_name='holo.StandardCommand.spots', index=16,
+      number=17, type=11, cpp_type=10, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
   ],
   extensions=[
   ],
@@ -259,7 +317,7 @@ _STANDARDCOMMAND = _descriptor.Descriptor(
   oneofs=[
   ],
   serialized_start=25,
-  serialized_end=670,
+  serialized_end=865,
 )
 
 
@@ -305,6 +363,48 @@ _STANDARDREPLY = _descriptor.Descriptor(
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       options=None),
+    _descriptor.FieldDescriptor(
+      name='frame_onsets', full_name='holo.StandardReply.frame_onsets', index=5,
+      number=6, type=1, cpp_type=5, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=_descriptor._ParseOptions(descriptor_pb2.FieldOptions(), _b('\020\001'))),
+    _descriptor.FieldDescriptor(
+      name='frame_timing_errors', full_name='holo.StandardReply.frame_timing_errors', index=6,
+      number=7, type=1, cpp_type=5, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=_descriptor._ParseOptions(descriptor_pb2.FieldOptions(), _b('\020\001'))),
+    _descriptor.FieldDescriptor(
+      name='playing', full_name='holo.StandardReply.playing', index=7,
+      number=8, type=8, cpp_type=7, label=1,
+      has_default_value=False, default_value=False,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='stage_timing', full_name='holo.StandardReply.stage_timing', index=8,
+      number=9, type=11, cpp_type=10, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='first_frame_time', full_name='holo.StandardReply.first_frame_time', index=9,
+      number=10, type=1, cpp_type=5, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='frames_ready', full_name='holo.StandardReply.frames_ready', index=10,
+      number=11, type=8, cpp_type=7, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=_descriptor._ParseOptions(descriptor_pb2.FieldOptions(), _b('\020\001'))),
   ],
   extensions=[
   ],
@@ -318,8 +418,117 @@ _STANDARDREPLY = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=673,
-  serialized_end=1010,
+  serialized_start=868,
+  serialized_end=1374,
+)
+
+
+_STAGETIMING = _descriptor.Descriptor(
+  name='StageTiming',
+  full_name='holo.StageTiming',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='stage', full_name='holo.StageTiming.stage', index=0,
+      number=1, type=9, cpp_type=9, label=2,
+      has_default_value=False, default_value=_b("").decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='seconds', full_name='holo.StageTiming.seconds', index=1,
+      number=2, type=1, cpp_type=5, label=2,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  options=None,
+  is_extendable=False,
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=1376,
+  serialized_end=1421,
+)
+
+
+_SPOTLIST = _descriptor.Descriptor(
+  name='SpotList',
+  full_name='holo.SpotList',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='frame_num', full_name='holo.SpotList.frame_num', index=0,
+      number=1, type=5, cpp_type=1, label=2,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='duration', full_name='holo.SpotList.duration', index=1,
+      number=2, type=1, cpp_type=5, label=2,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='x', full_name='holo.SpotList.x', index=2,
+      number=3, type=2, cpp_type=6, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=_descriptor._ParseOptions(descriptor_pb2.FieldOptions(), _b('\020\001'))),
+    _descriptor.FieldDescriptor(
+      name='y', full_name='holo.SpotList.y', index=3,
+      number=4, type=2, cpp_type=6, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=_descriptor._ParseOptions(descriptor_pb2.FieldOptions(), _b('\020\001'))),
+    _descriptor.FieldDescriptor(
+      name='z', full_name='holo.SpotList.z', index=4,
+      number=5, type=2, cpp_type=6, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=_descriptor._ParseOptions(descriptor_pb2.FieldOptions(), _b('\020\001'))),
+    _descriptor.FieldDescriptor(
+      name='radius', full_name='holo.SpotList.radius', index=5,
+      number=6, type=2, cpp_type=6, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=_descriptor._ParseOptions(descriptor_pb2.FieldOptions(), _b('\020\001'))),
+    _descriptor.FieldDescriptor(
+      name='weight', full_name='holo.SpotList.weight', index=6,
+      number=7, type=2, cpp_type=6, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=_descriptor._ParseOptions(descriptor_pb2.FieldOptions(), _b('\020\001'))),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  options=None,
+  is_extendable=False,
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=1424,
+  serialized_end=1556,
 )
 
 
@@ -362,22 +571,26 @@ _IMAGEMETA = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1012,
-  serialized_end=1076,
+  serialized_start=1558,
+  serialized_end=1622,
 )
 
 _STANDARDCOMMAND.fields_by_name['cmd'].enum_type = _STANDARDCOMMAND_CMDTYPES
 _STANDARDCOMMAND.fields_by_name['image_meta'].message_type = _IMAGEMETA
 _STANDARDCOMMAND.fields_by_name['algorithm'].enum_type = _STANDARDCOMMAND_ALGORITHMTYPES
+_STANDARDCOMMAND.fields_by_name['spots'].message_type = _SPOTLIST
 _STANDARDCOMMAND_CMDTYPES.containing_type = _STANDARDCOMMAND
 _STANDARDCOMMAND_ALGORITHMTYPES.containing_type = _STANDARDCOMMAND
 _STANDARDREPLY.fields_by_name['reply'].enum_type = _STANDARDREPLY_REPLYTYPES
 _STANDARDREPLY.fields_by_name['image_meta'].message_type = _IMAGEMETA
 _STANDARDREPLY.fields_by_name['error'].enum_type = _STANDARDREPLY_ERRORTYPES
+_STANDARDREPLY.fields_by_name['stage_timing'].message_type = _STAGETIMING
 _STANDARDREPLY_REPLYTYPES.containing_type = _STANDARDREPLY
 _STANDARDREPLY_ERRORTYPES.containing_type = _STANDARDREPLY
 DESCRIPTOR.message_types_by_name['StandardCommand'] = _STANDARDCOMMAND
 DESCRIPTOR.message_types_by_name['StandardReply'] = _STANDARDREPLY
+DESCRIPTOR.message_types_by_name['StageTiming'] = _STAGETIMING
+DESCRIPTOR.message_types_by_name['SpotList'] = _SPOTLIST
 DESCRIPTOR.message_types_by_name['ImageMeta'] = _IMAGEMETA
 
 StandardCommand = _reflection.GeneratedProtocolMessageType('StandardCommand', (_message.Message,), dict(
@@ -394,6 +607,20 @@ StandardReply = _reflection.GeneratedProtocolMessageType('StandardReply', (_mess
   ))
 _sym_db.RegisterMessage(StandardReply)
 
+StageTiming = _reflection.GeneratedProtocolMessageType('StageTiming', (_message.Message,), dict(
+  DESCRIPTOR = _STAGETIMING,
+  __module__ = 'holo_msg_pb2'
+  # @@protoc_insertion_point(class_scope:holo.StageTiming)
+  ))
+_sym_db.RegisterMessage(StageTiming)
+
+SpotList = _reflection.GeneratedProtocolMessageType('SpotList', (_message.Message,), dict(
+  DESCRIPTOR = _SPOTLIST,
+  __module__ = 'holo_msg_pb2'
+  # @@protoc_insertion_point(class_scope:holo.SpotList)
+  ))
+_sym_db.RegisterMessage(SpotList)
+
 ImageMeta = _reflection.GeneratedProtocolMessageType('ImageMeta', (_message.Message,), dict(
   DESCRIPTOR = _IMAGEMETA,
   __module__ = 'holo_msg_pb2'
@@ -404,4 +631,20 @@ _sym_db.RegisterMessage(ImageMeta)
 
 _STANDARDCOMMAND.fields_by_name['extraZlevels'].has_options = True
 _STANDARDCOMMAND.fields_by_name['extraZlevels']._options = _descriptor._ParseOptions(descriptor_pb2.FieldOptions(), _b('\020\001'))
+_STANDARDREPLY.fields_by_name['frame_onsets'].has_options = True
+_STANDARDREPLY.fields_by_name['frame_onsets']._options = _descriptor._ParseOptions(descriptor_pb2.FieldOptions(), _b('\020\001'))
+_STANDARDREPLY.fields_by_name['frame_timing_errors'].has_options = True
+_STANDARDREPLY.fields_by_name['frame_timing_errors']._options = _descriptor._ParseOptions(descriptor_pb2.FieldOptions(), _b('\020\001'))
+_STANDARDREPLY.fields_by_name['frames_ready'].has_options = True
+_STANDARDREPLY.fields_by_name['frames_ready']._options = _descriptor._ParseOptions(descriptor_pb2.FieldOptions(), _b('\020\001'))
+_SPOTLIST.fields_by_name['x'].has_options = True
+_SPOTLIST.fields_by_name['x']._options = _descriptor._ParseOptions(descriptor_pb2.FieldOptions(), _b('\020\001'))
+_SPOTLIST.fields_by_name['y'].has_options = True
+_SPOTLIST.fields_by_name['y']._options = _descriptor._ParseOptions(descriptor_pb2.FieldOptions(), _b('\020\001'))
+_SPOTLIST.fields_by_name['z'].has_options = True
+_SPOTLIST.fields_by_name['z']._options = _descriptor._ParseOptions(descriptor_pb2.FieldOptions(), _b('\020\001'))
+_SPOTLIST.fields_by_name['radius'].has_options = True
+_SPOTLIST.fields_by_name['radius']._options = _descriptor._ParseOptions(descriptor_pb2.FieldOptions(), _b('\020\001'))
+_SPOTLIST.fields_by_name['weight'].has_options = True
+_SPOTLIST.fields_by_name['weight']._options = _descriptor._ParseOptions(descriptor_pb2.FieldOptions(), _b('\020\001'))
 # @@protoc_insertion_point(module_scope)
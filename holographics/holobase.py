@@ -19,21 +19,29 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from __future__ import division, print_function
 
 import ConfigParser
-import os.path
+import multiprocessing
+import os
 import time
+import traceback
+from collections import deque
 
+import gevent
 import numpy as np
 import zmq.green as zmq
-from joblib import Parallel, delayed
-from scipy.misc import imsave
+from gevent.event import AsyncResult
+from gevent.lock import Semaphore
 
 import holo_msg_pb2
 import serializer
 from SLM_correction import SLM_correction
 from calibration2 import CorrectionFactorCalibrator, XYCalibrator, ZCalibrator, CameraHandle
-from frame import Frame
-from holographics.frame_computation import computemultipatternhologram, frame_diffraction_effs
+from hologram_sequence import HologramSequence, valid_sequence_name
+from holographics import GSF, fft_backend  # the modules the solvers use, not top level copies
+from holographics.frame_computation import submitgroup, frame_diffraction_effs, init_worker, warm_up_fft, \
+    cache as hologram_cache, warm_starts
 from playframes import Frameplayer
+from stage_timer import StageTimer
+from trial_archive import TrialArchiver
 
 
 def checkframes(frames):
@@ -61,15 +69,50 @@ class Holobase(object):
             self.config.read('holo_config.cfg')
         except ConfigParser.Error as e:
             raise Exception('Failed to read config file!')
+        fft_backend.set_backend_from_config(self.config)
+        if self.config.has_section('cache'):
+            hologram_cache.max_size_mb = float(self.config.get('cache', 'max_size_mb'))
+            hologram_cache.evict()
+        if self.config.has_option('gsf', 'lens_cache_mb'):
+            GSF.lens_cache_max_mb = float(self.config.get('gsf', 'lens_cache_mb'))
+
+        # the FFT plans are made at startup for the solver precision, and up to warmup_planes stacked planes
+        precision = self.config.get('gsf', 'precision') if self.config.has_option('gsf', 'precision') else 'single'
+        warmup_planes = 1
+        if self.config.has_option('compute', 'warmup_planes'):
+            warmup_planes = int(self.config.get('compute', 'warmup_planes'))
+
+        # started before anything else, so the workers don't inherit sockets, the window or the camera
+        self.compute_pool = None
+        self.max_pending_groups = 1  # frame_num groups submitted and not finished yet, while generating
+        if self.config.has_section('compute'):
+            nworkers = int(self.config.get('compute', 'workers'))
+            if nworkers > 1:
+                fft = fft_backend.get_backend()
+                print("Starting %d compute workers" % nworkers)
+                self.max_pending_groups = 2 * nworkers
+                self.compute_pool = multiprocessing.Pool(nworkers, initializer=init_worker,
+                                                         initargs=(fft.name, fft.threads, hologram_cache.max_size_mb,
+                                                                   GSF.lens_cache_max_mb, precision, warmup_planes))
+        if self.compute_pool is None:  # solved in this process
+            warm_up_fft(precision, warmup_planes)
 
         self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.REP)
+        self.socket = self.context.socket(zmq.ROUTER)  # REQ clients, but requests are answered concurrently
         address = "tcp://*:" + self.config.get('IP', 'ZMQport')
         print("binding to: ", address)
         self.socket.bind(address)
 
-        self.frameplayer = Frameplayer(fullscreen='auto')
+        lookahead = None  # frames uploaded ahead of playback, all of them by default
+        self.sequence_dir = './_sequences'  # sequences stored on disk, by name
+        if self.config.has_section('sequences'):
+            if self.config.has_option('sequences', 'lookahead'):
+                lookahead = int(self.config.get('sequences', 'lookahead'))
+            if self.config.has_option('sequences', 'directory'):
+                self.sequence_dir = self.config.get('sequences', 'directory')
+        self.frameplayer = Frameplayer(fullscreen='auto', lookahead=lookahead)
         self.SLM_correction = SLM_correction()
+        self.archiver = TrialArchiver()
 
         self.CameraHandle = CameraHandle()
         self.CorrectionFactorCalibrator = CorrectionFactorCalibrator(self.CameraHandle, self)
@@ -78,211 +121,430 @@ class Holobase(object):
 
         self.wavelength = float(self.config.get('holo', 'wavelength'))
         self.correction_factor = float(self.config.get('holo', 'correction_factor'))
+        self.solver_params = {}  # iterations (maximum), tolerance for early stopping and precision, see GS_3D_batched
+        if self.config.has_section('gsf'):
+            self.solver_params = dict(iterations=int(self.config.get('gsf', 'max_iterations')),
+                                      tolerance=round(float(self.config.get('gsf', 'tolerance')), 6),
+                                      precision=self.config.get('gsf', 'precision'))
+            if self.config.has_option('gsf', 'warm_start_similarity'):
+                warm_starts.min_similarity = float(self.config.get('gsf', 'warm_start_similarity'))
 
         self.pre_frames = None
         self.postgsf_frames = None
+        self.loaded_frames = None  # postgsf_frames currently uploaded to the frameplayer
+
+        self.generate_lock = Semaphore()
+        self.playback = None  # greenlet of the current/last PLAY
+        self.fatal_error = AsyncResult()
 
         self.run()
 
-    def generate_frames(self, frames, npatterns=1, correction_factor=None):
-        frame_nums = np.asarray([f.frame_num for f in frames])
-        frame_idxss = [np.where(frame_nums == fn)[0].tolist() for fn in set(frame_nums)]  # list of lists by frame_num
+    def prepare_frames(self, frames, timer):
+        """ Calibration and rasterization of one group of contemporaneous frames, ready to be solved """
+        with timer('calibrate'):
+            for frame in frames:
+                if frame.spots is not None:
+                    frame.spots = self.XYCalibrator.apply_spots(frame.spots)
+                else:
+                    frame.svg = self.XYCalibrator.apply(frame.svg_tree())
+                self.ZCalibrator.apply(frame)
+        with timer('rasterize'):
+            for frame in frames:
+                frame.rasterize()
+                print("frame after calib and bounding", frame.svg)
+        with timer('diffraction_eff'):
+            frame_diffraction_effs(frames)
+
+    def generate_frames(self, frames, npatterns=1, correction_factor=None, prepare=None, stream=False,
+                        pre_frames=None, solver_params=None, path=None):
+        """
+        Computes the holograms as a pipeline over the frame_num groups: while the compute workers solve a group, the
+        next group is prepared, and the finished ones are corrected and uploaded to the frameplayer
+        Preparing, solving in this process and correcting run in a thread, so the event loop (and with it the
+        frameplayer, between flips) only has to upload the finished frames
+        :param prepare: called with each group and the timer before solving it (ie self.prepare_frames)
+        :param stream: start playing as soon as the first frame is uploaded, the rest are added while playing
+        :param pre_frames: requested frames, logged with the played sequence when streaming
+        :param solver_params: overrides self.solver_params for this request
+        :param path: directory to store the sequence in (memory mapped, written as the frames finish), for long
+        sequences that shouldn't be kept in memory, and to play them again later
+        :return: StageTimer with the time spent in each stage, and when the first frame was ready, and the playback
+        greenlet started when streaming (None if it wasn't, ie a PLAY took over the frameplayer first)
+        """
+        if correction_factor is None:
+            correction_factor = self.correction_factor
+        if solver_params is None:
+            solver_params = self.solver_params
+        timer = StageTimer()
+        threadpool = gevent.get_hub().threadpool  # apply() runs in a thread, only this greenlet waits for it
+        groups = [[f for f in frames if f.frame_num == fn] for fn in sorted(set(f.frame_num for f in frames))]
+
+        if stream and self.playing():  # streaming needs the frameplayer, wait for the current sequence
+            self.playback.join()
+
+        postgsf_frames = HologramSequence(len(groups), npatterns, path=path)
+        if not self.playing():  # otherwise they are uploaded by the next PLAY, once the current sequence is done
+            self.frameplayer.clearframes(streaming=stream)
+            self.loaded_frames = postgsf_frames  # filled in as the groups finish
+
+        def finish(group, result):
+            with timer('solve_wait'):
+                while not result.ready():
+                    gevent.sleep(.005)
+            holos, solve_time = result.get()
+            timer.add('solve', solve_time)
+            for f in group:
+                f.raster = None  # not needed anymore, so only the groups in flight hold rasters
+
+            with timer('correct'):
+                index = postgsf_frames.append(holos, group[0].duration, np.mean([f.Zlevel for f in group]))
+                threadpool.apply(postgsf_frames.correct, (self.SLM_correction, self.wavelength, correction_factor,
+                                                          index))
+            # a PLAY of the previous frames during generation takes over the frameplayer, then these are loaded later
+            if self.loaded_frames is postgsf_frames and (self.frameplayer.streaming or not self.playing()):
+                with timer('upload'):
+                    self.frameplayer.addframe(postgsf_frames[index])
+            timer.mark('first_frame')
+            if stream and len(postgsf_frames) == 1 and self.loaded_frames is postgsf_frames:
+                self.playback = gevent.spawn(self.play, pre_frames, postgsf_frames)
+                playback.append(self.playback)
+
+        playback = []  # of this sequence, if streamed
+        pending = deque()
+        try:
+            for group in groups:
+                while len(pending) >= self.max_pending_groups:  # the solved holograms don't pile up either
+                    finish(*pending.popleft())
+                if prepare is not None:
+                    threadpool.apply(prepare, (group, timer))
+                # cache lookups and warm starts too, and the whole solve when there's no pool
+                pending.append((group, threadpool.apply(submitgroup, (group, self.wavelength),
+                                                        dict(solver_params, pool=self.compute_pool))))
+                while pending and pending[0][1].ready():
+                    finish(*pending.popleft())
+                gevent.sleep(0)  # let playback and other requests run in between groups
+            while pending:
+                finish(*pending.popleft())
+        finally:
+            self.frameplayer.end_stream()  # otherwise playback would hold the last frame forever
+
+        postgsf_frames.flush()
+        postgsf_frames.remove_previous()
+        self.postgsf_frames = postgsf_frames
+        timer.mark('done')
+        print("Generated %d frames: %s" % (len(postgsf_frames), timer.report()))
+        return timer, (playback[0] if playback else None)
+
+    def recorrect(self, correction_factor):
+        """
+        Applies the SLM corrections again to the generated frames, with a new correction factor, from the
+        uncorrected holograms (no solving)
+        The holograms are corrected in place, so this waits until they've been played and archived
+        """
+        while self.playing() or self.archiver.pending():
+            gevent.sleep(.01)
+        self.correction_factor = correction_factor
+        gevent.get_hub().threadpool.apply(self.postgsf_frames.correct, (self.SLM_correction,
+                                                                        self.postgsf_frames.wavelength,
+                                                                        correction_factor))
+        if self.loaded_frames is self.postgsf_frames:
+            self.loaded_frames = None  # uploaded again by the next PLAY
+
+    def open_sequence(self, path):
+        """
+        Makes a stored sequence the current one, corrected with the current correction factor
+        :return: error message if it can't be played
+        """
+        try:
+            sequence = HologramSequence.open(path)
+        except (IOError, OSError, ValueError) as e:
+            return "Error, can't read the stored sequence: %s" % e
+        if not len(sequence):
+            return "Error, the stored sequence has no frames!"
+        if sequence.wavelength != self.wavelength:
+            return "Error, the stored sequence was computed for %d nm, not %d nm!" % (sequence.wavelength,
+                                                                                     self.wavelength)
+        self.postgsf_frames = sequence
+        self.pre_frames = []  # the requested svgs aren't stored
+        if sequence.correction_factor != self.correction_factor:
+            self.recorrect(self.correction_factor)
+            print("Stored sequence corrected with correction factor %.3f" % self.correction_factor)
+
+    def sequence_path(self, name):
+        """ Directory of a stored sequence, see valid_sequence_name """
+        return os.path.join(self.sequence_dir, name)
+
+    def load_frames(self, postgsf_frames):
+        if self.loaded_frames is not postgsf_frames:
+            self.frameplayer.loadframes(postgsf_frames)
+            self.loaded_frames = postgsf_frames
+
+    def playing(self):
+        return self.playback is not None and not self.playback.ready()
+
+    def play(self, pre_frames, postgsf_frames):
+        """
+        Plays the frames and logs them afterwards, runs in its own greenlet so other requests are still handled
+        :return: frame onsets, timing errors and whether each frame was ready in time (only relevant when streaming)
+        """
+        self.load_frames(postgsf_frames)
+        timestamp = time.localtime()
+        self.frameplayer.playframes_nonblocking().join()
+        onsets, timing_errors = self.frameplayer.frame_timing()
+        ready = self.frameplayer.frames_ready_in_time()
+        print("Done playing frames, timing errors (s): ", timing_errors)
+        print("")
+
+        # written in the background, the reply doesn't wait for the disk
+        self.archiver.archive(timestamp, pre_frames, postgsf_frames,
+                              frame_onsets=onsets, frame_timing_errors=timing_errors, frames_ready=ready,
+                              wavelength=postgsf_frames.wavelength, correction_factor=postgsf_frames.correction_factor)
+
+        return onsets, timing_errors, ready
+
+    @staticmethod
+    def fill_playback_reply(replymsg, playback_result):
+        onsets, timing_errors, ready = playback_result
+        replymsg.playing = False
+        replymsg.frame_onsets.extend(onsets)
+        replymsg.frame_timing_errors.extend(timing_errors)
+        replymsg.frames_ready.extend(ready.tolist())
+        if not all(ready):
+            print("Frames not ready in time: ", np.where(~ready)[0])
+
+    def run(self):
+        print("Holobase running...")
+        receiver = gevent.spawn(self.receive)
+        receiver.link_exception(lambda greenlet: self.fatal_error.set_exception(greenlet.exception))
+        try:
+            self.fatal_error.get()  # requests are handled in their own greenlets, this only returns by raising
+        finally:
+            self.quit()
 
-        durations = [frames[frame_idx[0]].duration for frame_idx in frame_idxss]
+    def receive(self):
+        while True:
+            msg = self.socket.recv_multipart()
+            envelope, msg = msg[:2], msg[2:]  # ROUTER socket: client identity and empty delimiter, then the request
+            gevent.spawn(self.handle, envelope, msg)
 
-        holos = Parallel()(
-            [delayed(computemultipatternhologram)([frames[fi] for fi in frame_idxs], self.wavelength) for frame_idxs in frame_idxss])
+    def handle(self, envelope, msg):
+        """ Handles a single request and replies to it, in its own greenlet so slow requests don't block others """
+        try:
+            replymsg = self.handle_request(msg)
+            self.socket.send_multipart(envelope + serializer.serialize(replymsg))
+
+        except Exception as e:
+            traceback.print_exc()
+            replymsg = holo_msg_pb2.StandardReply()
+            replymsg.reply = holo_msg_pb2.StandardReply.ERROR
+            replymsg.error = holo_msg_pb2.StandardReply.SOFTWARE
+            replymsg.error_message = "Unhandled error inside our software - quitting now!"
+            self.socket.send_multipart(envelope + serializer.serialize(replymsg))
+            gevent.sleep(1)
+            self.fatal_error.set_exception(e)
+
+    def handle_request(self, msg):
+        try:
+            msg, frames = serializer.unserialize(msg, holo_msg_pb2.StandardCommand())
 
-        # holos = Parallel()(
-        #     [delayed(computemultipatternhologram)(t, Z, self.wavelength, npatterns) for t, Z in zip(targets, Zs)])
-        postgsf_frames = [Frame(holograms=fs, duration=d, frame_num=i) for i, (fs, d) in
-                          enumerate(zip(holos, durations))]
+        except AssertionError:
+            replymsg = holo_msg_pb2.StandardReply()
+            replymsg.reply = holo_msg_pb2.StandardReply.ERROR
+            replymsg.error = holo_msg_pb2.StandardReply.BAD_REQUEST
+            replymsg.error_message = "Error, number of image_metas in command and number of holographic frames need to match!"
 
-        [frame.apply_deformation_correction(self.SLM_correction, self.wavelength) for frame in postgsf_frames]
-        if correction_factor is not None:
-            [frame.apply_factor_correction(correction_factor) for frame in postgsf_frames]
         else:
-            [frame.apply_factor_correction(self.correction_factor) for frame in postgsf_frames]
-        self.frameplayer.loadframes(postgsf_frames)
-        self.postgsf_frames = postgsf_frames
+            print(msg, ' #frames attached:', len(frames))
+            print('')
 
-    def run(self):
-        print("Holobase running...")
-        while True:
-            try:
-                msg = self.socket.recv_multipart()
-                try:
-                    msg, frames = serializer.unserialize(msg, holo_msg_pb2.StandardCommand())
+            if msg.HasField('sequence_name') and not valid_sequence_name(msg.sequence_name):
+                replymsg = holo_msg_pb2.StandardReply()
+                replymsg.reply = holo_msg_pb2.StandardReply.ERROR
+                replymsg.error = holo_msg_pb2.StandardReply.BAD_REQUEST
+                replymsg.error_message = "Error, sequence_name must be a plain file name!"
 
-                except AssertionError:
+            elif msg.cmd == holo_msg_pb2.StandardCommand.STATUS:
+                replymsg = holo_msg_pb2.StandardReply()
+                replymsg.reply = holo_msg_pb2.StandardReply.OK
+                replymsg.playing = self.playing()
+
+            elif msg.cmd == holo_msg_pb2.StandardCommand.GENERATE:
+                if msg.wavelength:
+                    if msg.wavelength != self.wavelength:
+                        self.wavelength = msg.wavelength
+                        print("Setting wavelength to %d" % self.wavelength)
+                if msg.correction_factor:
+                    if msg.correction_factor != self.correction_factor:
+                        self.correction_factor = msg.correction_factor
+                        print("Setting correction factor to %.3f" % self.correction_factor)
+
+                if len(frames) == 0:
                     replymsg = holo_msg_pb2.StandardReply()
                     replymsg.reply = holo_msg_pb2.StandardReply.ERROR
                     replymsg.error = holo_msg_pb2.StandardReply.BAD_REQUEST
-                    replymsg.error_message = "Error, number of image_metas in command and number of holographic frames need to match!"
-
+                    replymsg.error_message = "Error, need to send frames to generate!"
+                elif msg.HasField('max_iterations') and msg.max_iterations < 1:
+                    replymsg = holo_msg_pb2.StandardReply()
+                    replymsg.reply = holo_msg_pb2.StandardReply.ERROR
+                    replymsg.error = holo_msg_pb2.StandardReply.BAD_REQUEST
+                    replymsg.error_message = "Error, max_iterations must be at least 1!"
                 else:
-                    print(msg, ' #frames attached:', len(frames))
-                    print('')
-
-                    if msg.cmd == holo_msg_pb2.StandardCommand.STATUS:
+                    try:
+                        checkframes(frames)
+                    except AssertionError:
                         replymsg = holo_msg_pb2.StandardReply()
-                        replymsg.reply = holo_msg_pb2.StandardReply.OK
+                        replymsg.reply = holo_msg_pb2.StandardReply.ERROR
+                        replymsg.error = holo_msg_pb2.StandardReply.BAD_REQUEST
+                        replymsg.error_message = "Error, frames incorrectly specified!"
+
+                    solver_params = dict(self.solver_params)
+                    if msg.HasField('max_iterations'):
+                        solver_params['iterations'] = msg.max_iterations
+                    if msg.HasField('tolerance'):
+                        # 0 turns early stopping off; the float32 field is rounded, like the config value is written
+                        solver_params['tolerance'] = round(float(msg.tolerance), 6) or None
+                    if msg.algorithm != holo_msg_pb2.StandardCommand.GLS:
+                        solver_params['algorithm'] = holo_msg_pb2.StandardCommand.AlgorithmTypes.Name(msg.algorithm)
+
+                    path = self.sequence_path(msg.sequence_name) if msg.HasField('sequence_name') else None
+                    with self.generate_lock:
+                        pre_frames = [frame.copy() for frame in frames]
+                        timer, playback = self.generate_frames(frames, prepare=self.prepare_frames,
+                                                               stream=msg.stream, pre_frames=pre_frames,
+                                                               solver_params=solver_params, path=path)
+                        self.pre_frames = pre_frames
+                    replymsg = holo_msg_pb2.StandardReply()
+                    replymsg.reply = holo_msg_pb2.StandardReply.OK
+                    for stage, seconds in timer.stages.items():
+                        replymsg.stage_timing.add(stage=stage, seconds=seconds)
+                    replymsg.first_frame_time = timer.events['first_frame']
+                    if msg.stream:  # only this sequence's playback, not a PLAY that took over the frameplayer
+                        replymsg.playing = playback is not None and not playback.ready()
+                        if msg.wait and playback is not None:
+                            self.fill_playback_reply(replymsg, playback.get())
+
+            elif msg.cmd == holo_msg_pb2.StandardCommand.PLAY:
+                path = self.sequence_path(msg.sequence_name) if msg.HasField('sequence_name') else None
+                if path is not None and not os.path.exists(path):
+                    replymsg = holo_msg_pb2.StandardReply()
+                    replymsg.reply = holo_msg_pb2.StandardReply.ERROR
+                    replymsg.error = holo_msg_pb2.StandardReply.BAD_REQUEST
+                    replymsg.error_message = "Error, no stored sequence named %s!" % msg.sequence_name
 
-                    elif msg.cmd == holo_msg_pb2.StandardCommand.GENERATE:
-                        if msg.wavelength:
-                            if msg.wavelength != self.wavelength:
-                                self.wavelength = msg.wavelength
-                                print("Setting wavelength to %d" % self.wavelength)
-                        if msg.correction_factor:
-                            if msg.correction_factor != self.correction_factor:
-                                self.correction_factor = msg.correction_factor
-                                print("Setting correction factor to %.3f" % self.correction_factor)
-
-                        if len(frames) == 0:
-                            replymsg = holo_msg_pb2.StandardReply()
-                            replymsg.reply = holo_msg_pb2.StandardReply.ERROR
-                            replymsg.error = holo_msg_pb2.StandardReply.BAD_REQUEST
-                            replymsg.error_message = "Error, need to send frames to generate!"
-                        else:
-                            try:
-                                checkframes(frames)
-                            except AssertionError:
-                                replymsg = holo_msg_pb2.StandardReply()
-                                replymsg.reply = holo_msg_pb2.StandardReply.ERROR
-                                replymsg.error = holo_msg_pb2.StandardReply.BAD_REQUEST
-                                replymsg.error_message = "Error, frames incorrectly specified!"
-
-                            self.pre_frames = [frame.copy() for frame in frames]
-                            for frame in frames:
-                                # print ("frame before calib and bounding", frame.svg)
-                                frame.svg = self.XYCalibrator.apply(frame.svg)
-                                self.ZCalibrator.apply(frame)
-                                frame.rasterize()
-                                print("frame after calib and bounding", frame.svg)
-
-                            frame_diffraction_effs(frames)
-                            self.generate_frames(frames)
-                            replymsg = holo_msg_pb2.StandardReply()
-                            replymsg.reply = holo_msg_pb2.StandardReply.OK
-
-                    elif msg.cmd == holo_msg_pb2.StandardCommand.PLAY:
-                        if self.postgsf_frames is None:
-                            replymsg = holo_msg_pb2.StandardReply()
-                            replymsg.reply = holo_msg_pb2.StandardReply.ERROR
-                            replymsg.error = holo_msg_pb2.StandardReply.BAD_REQUEST
-                            replymsg.error_message = "Error, haven't sent any frames yet!"
-
-                        else:
-                            timestamp = time.localtime()
-                            self.frameplayer.playframes()
-                            print("Done playing frames")
-                            print("")
-
-                            directory = './_raw_svgs'
-                            if not os.path.exists(directory):
-                                os.mkdir(directory)
-                            for i, frame in enumerate(self.pre_frames):
-                                filename = time.strftime("%Y_%m_%d__%H-%M-%S_frame", timestamp) + str(
-                                    i) + "_%d" % frame.frame_num + '.svg'
-                                if os.path.exists(directory) and frame.svg:
-                                    filepath = os.path.join(directory, filename)
-                                    with open(filepath, 'wb') as f:
-                                        f.write(frame.svg)
-                                else:
-                                    print("error saving svg log data!!!!!!!!!!!!!!!!!!!")
-
-                            # directory = './_rasters'
-                            # if not os.path.exists(directory):
-                            #     os.mkdir(directory)
-                            # for i, frame in enumerate(self.postgsf_frames):
-                            #     filename = time.strftime("%Y_%m_%d__%H-%M-%S_frame", timestamp) + str(
-                            #         i) + "_%d" % frame.frame_num + '.'
-                            #     if os.path.exists(directory) and frame.raster:
-                            #         imsave(os.path.join(directory, filename), frame.raster)
-                            #     else:
-                            #         print ("error saving raster log data!!!!!!!!!!!!!!!!!!!")
-
-                            directory = './_raw_postgsfs'
-                            if not os.path.exists(directory):
-                                os.mkdir(directory)
-                            for i, frame in enumerate(self.postgsf_frames):
-                                if os.path.exists(directory) and frame.holograms is not None:
-                                    for j, holoframe in enumerate(frame.holograms):
-                                        filename = time.strftime("%Y_%m_%d__%H-%M-%S_frame", timestamp) + str(i) + str(
-                                            j) + "_%.2f" % frame.frame_num + '.bmp'
-                                        filepath = os.path.join(directory, filename)
-                                        imsave(filepath, holoframe.T)
-                                else:
-                                    print("error saving postgsf log data!!!!!!!!!!!!!!!!!!!")
-
-                            replymsg = holo_msg_pb2.StandardReply()
-                            replymsg.reply = holo_msg_pb2.StandardReply.OK
-
-                    elif msg.cmd == holo_msg_pb2.StandardCommand.CALIBRATE_BACKGROUND:
-                        self.XYCalibrator.grab_background()
-                        replymsg = holo_msg_pb2.StandardReply()
-                        replymsg.reply = holo_msg_pb2.StandardReply.OK
+                elif path is None and self.postgsf_frames is None:
+                    replymsg = holo_msg_pb2.StandardReply()
+                    replymsg.reply = holo_msg_pb2.StandardReply.ERROR
+                    replymsg.error = holo_msg_pb2.StandardReply.BAD_REQUEST
+                    replymsg.error_message = "Error, haven't sent any frames yet!"
 
-                    elif msg.cmd == holo_msg_pb2.StandardCommand.CALIBRATE_CIRCLE:
-                        self.XYCalibrator.grab_circle_image((msg.calibration_circle_x, msg.calibration_circle_y))
+                else:
+                    if self.playing():  # one sequence at a time, wait for the previous one
+                        self.playback.join()
+                    error = None
+                    if path is not None and getattr(self.postgsf_frames, 'path', None) != path:
+                        with self.generate_lock:
+                            error = self.open_sequence(path)
+                    if error is not None:
                         replymsg = holo_msg_pb2.StandardReply()
-                        replymsg.reply = holo_msg_pb2.StandardReply.OK
+                        replymsg.reply = holo_msg_pb2.StandardReply.ERROR
+                        replymsg.error = holo_msg_pb2.StandardReply.BAD_REQUEST
+                        replymsg.error_message = error
+                    else:
+                        self.playback = gevent.spawn(self.play, self.pre_frames, self.postgsf_frames)
 
-                    elif msg.cmd == holo_msg_pb2.StandardCommand.CALIBRATE_RUN:
-                        self.XYCalibrator.run()
                         replymsg = holo_msg_pb2.StandardReply()
                         replymsg.reply = holo_msg_pb2.StandardReply.OK
+                        replymsg.playing = True
+                        if msg.wait:
+                            self.fill_playback_reply(replymsg, self.playback.get())
+
+            elif msg.cmd == holo_msg_pb2.StandardCommand.STOP:
+                if self.playing():
+                    self.frameplayer.stop()
+                    print("Stopping playback")
+                replymsg = holo_msg_pb2.StandardReply()
+                replymsg.reply = holo_msg_pb2.StandardReply.OK
 
-                    elif msg.cmd == holo_msg_pb2.StandardCommand.CALIBRATE_CORRECTION_FACTOR:
-                        self.correction_factor = self.CorrectionFactorCalibrator.calibrate()
-                        print("Correction factor calibrated to: ", self.correction_factor)
-                        replymsg = holo_msg_pb2.StandardReply()
-                        replymsg.reply = holo_msg_pb2.StandardReply.OK
+            elif msg.cmd == holo_msg_pb2.StandardCommand.CALIBRATE_BACKGROUND:
+                self.XYCalibrator.grab_background()
+                replymsg = holo_msg_pb2.StandardReply()
+                replymsg.reply = holo_msg_pb2.StandardReply.OK
 
-                    elif msg.cmd == holo_msg_pb2.StandardCommand.CALIBRATE_Z:
-                        self.ZCalibrator.calibrateZ(msg.calibration_Z_level)
-                        replymsg = holo_msg_pb2.StandardReply()
-                        replymsg.reply = holo_msg_pb2.StandardReply.OK
+            elif msg.cmd == holo_msg_pb2.StandardCommand.CALIBRATE_CIRCLE:
+                self.XYCalibrator.grab_circle_image((msg.calibration_circle_x, msg.calibration_circle_y))
+                replymsg = holo_msg_pb2.StandardReply()
+                replymsg.reply = holo_msg_pb2.StandardReply.OK
 
-                    elif msg.cmd == holo_msg_pb2.StandardCommand.CALIBRATE_Z_OBJ:
-                        if msg.objectiveZlevel is None:
-                            replymsg = holo_msg_pb2.StandardReply()
-                            replymsg.reply = holo_msg_pb2.StandardReply.ERROR
-                            replymsg.error = holo_msg_pb2.StandardReply.BAD_REQUEST
-                            replymsg.error_message = "Error, need to provide the objective Z level"
-                        else:
-                            self.ZCalibrator.setobjectiveZlevel(msg.objectiveZlevel)
-                            replymsg = holo_msg_pb2.StandardReply()
-                            replymsg.reply = holo_msg_pb2.StandardReply.OK
-
-                    elif msg.cmd == holo_msg_pb2.StandardCommand.CALIBRATE_Z_RUN:
-                        self.ZCalibrator.run()
-                        replymsg = holo_msg_pb2.StandardReply()
-                        replymsg.reply = holo_msg_pb2.StandardReply.OK
+            elif msg.cmd == holo_msg_pb2.StandardCommand.CALIBRATE_RUN:
+                self.XYCalibrator.run()
+                replymsg = holo_msg_pb2.StandardReply()
+                replymsg.reply = holo_msg_pb2.StandardReply.OK
 
-                    elif msg.cmd == holo_msg_pb2.StandardCommand.CALIBRATE_RELEASE:
-                        self.CameraHandle.release_cam()
-                        replymsg = holo_msg_pb2.StandardReply()
-                        replymsg.reply = holo_msg_pb2.StandardReply.OK
+            elif msg.cmd == holo_msg_pb2.StandardCommand.CALIBRATE_CORRECTION_FACTOR:
+                self.correction_factor = self.CorrectionFactorCalibrator.calibrate()
+                print("Correction factor calibrated to: ", self.correction_factor)
+                replymsg = holo_msg_pb2.StandardReply()
+                replymsg.reply = holo_msg_pb2.StandardReply.OK
 
-                    else:
-                        replymsg = holo_msg_pb2.StandardReply()
-                        replymsg.reply = holo_msg_pb2.StandardReply.ERROR
-                        replymsg.error = holo_msg_pb2.StandardReply.BAD_REQUEST
-                        replymsg.error_message = "Received an unknown message type!"
+            elif msg.cmd == holo_msg_pb2.StandardCommand.CALIBRATE_Z:
+                self.ZCalibrator.calibrateZ(msg.calibration_Z_level)
+                replymsg = holo_msg_pb2.StandardReply()
+                replymsg.reply = holo_msg_pb2.StandardReply.OK
+
+            elif msg.cmd == holo_msg_pb2.StandardCommand.CALIBRATE_Z_OBJ:
+                if msg.objectiveZlevel is None:
+                    replymsg = holo_msg_pb2.StandardReply()
+                    replymsg.reply = holo_msg_pb2.StandardReply.ERROR
+                    replymsg.error = holo_msg_pb2.StandardReply.BAD_REQUEST
+                    replymsg.error_message = "Error, need to provide the objective Z level"
+                else:
+                    self.ZCalibrator.setobjectiveZlevel(msg.objectiveZlevel)
+                    replymsg = holo_msg_pb2.StandardReply()
+                    replymsg.reply = holo_msg_pb2.StandardReply.OK
 
-                self.socket.send_multipart(serializer.serialize(replymsg))
+            elif msg.cmd == holo_msg_pb2.StandardCommand.CALIBRATE_Z_RUN:
+                self.ZCalibrator.run()
+                replymsg = holo_msg_pb2.StandardReply()
+                replymsg.reply = holo_msg_pb2.StandardReply.OK
 
-            except Exception as e:
+            elif msg.cmd == holo_msg_pb2.StandardCommand.CALIBRATE_RELEASE:
+                self.CameraHandle.release_cam()
+                replymsg = holo_msg_pb2.StandardReply()
+                replymsg.reply = holo_msg_pb2.StandardReply.OK
+
+            elif msg.cmd == holo_msg_pb2.StandardCommand.CORRECT:
+                if self.postgsf_frames is None or not msg.correction_factor:
+                    replymsg = holo_msg_pb2.StandardReply()
+                    replymsg.reply = holo_msg_pb2.StandardReply.ERROR
+                    replymsg.error = holo_msg_pb2.StandardReply.BAD_REQUEST
+                    replymsg.error_message = "Error, need generated frames and a correction factor!"
+                else:
+                    with self.generate_lock:
+                        self.recorrect(msg.correction_factor)
+                    print("Frames corrected with correction factor %.3f" % self.correction_factor)
+                    replymsg = holo_msg_pb2.StandardReply()
+                    replymsg.reply = holo_msg_pb2.StandardReply.OK
+
+            elif msg.cmd == holo_msg_pb2.StandardCommand.CLEAR_CACHE:
+                with self.generate_lock:  # not while a generate uses them, from its thread
+                    hologram_cache.clear()
+                    warm_starts.clear()
+                print("Hologram cache cleared")
+                replymsg = holo_msg_pb2.StandardReply()
+                replymsg.reply = holo_msg_pb2.StandardReply.OK
+
+            else:
                 replymsg = holo_msg_pb2.StandardReply()
                 replymsg.reply = holo_msg_pb2.StandardReply.ERROR
-                replymsg.error = holo_msg_pb2.StandardReply.SOFTWARE
-                replymsg.error_message = "Unhandled error inside our software - quitting now!"
-                self.socket.send_multipart(serializer.serialize(replymsg))
-                time.sleep(1)
-                raise
+                replymsg.error = holo_msg_pb2.StandardReply.BAD_REQUEST
+                replymsg.error_message = "Received an unknown message type!"
+
+        return replymsg
 
     def quit(self):
+        self.archiver.flush()  # the writer thread is a daemon, queued trials would be lost
+        if self.compute_pool is not None:
+            self.compute_pool.terminate()
         self.context.term()
 
 
@@ -49,15 +49,48 @@ class Status(Message):
 
 
 class Play(Message):
-    def __init__(self):
+    def __init__(self, wait=True, sequence_name=None):
         super(Play, self).__init__()
         self.cmd.cmd = holo_msg_pb2.StandardCommand.PLAY
+        self.cmd.wait = wait
+        if sequence_name is not None:
+            self.cmd.sequence_name = sequence_name
+
+
+class Stop(Message):
+    def __init__(self):
+        super(Stop, self).__init__()
+        self.cmd.cmd = holo_msg_pb2.StandardCommand.STOP
+
+
+class Clear_Cache(Message):
+    def __init__(self):
+        super(Clear_Cache, self).__init__()
+        self.cmd.cmd = holo_msg_pb2.StandardCommand.CLEAR_CACHE
+
+
+class Correct(Message):
+    def __init__(self, correction_factor):
+        super(Correct, self).__init__()
+        self.cmd.cmd = holo_msg_pb2.StandardCommand.CORRECT
+        self.cmd.correction_factor = correction_factor
 
 
 class Generate(Message):
-    def __init__(self, frames, wavelength=None, correction_factor=None):
+    def __init__(self, frames, wavelength=None, correction_factor=None, stream=False, wait=True, max_iterations=None,
+                 tolerance=None, algorithm=None, sequence_name=None):
         super(Generate, self).__init__()
         self.cmd.cmd = holo_msg_pb2.StandardCommand.GENERATE
+        self.cmd.stream = stream
+        self.cmd.wait = wait
+        if max_iterations is not None:
+            self.cmd.max_iterations = max_iterations
+        if tolerance is not None:
+            self.cmd.tolerance = tolerance
+        if algorithm is not None:
+            self.cmd.algorithm = algorithm
+        if sequence_name is not None:
+            self.cmd.sequence_name = sequence_name
         if wavelength:
             self.cmd.wavelength = wavelength
         if correction_factor:
@@ -69,6 +102,18 @@ class Generate(Message):
             frame_meta.frame_num = frame.frame_num
             frame_meta.duration = frame.duration
 
+    def add_spots(self, frame_num, duration, x, y, z, radius, weight=None):
+        """ Adds a frame_num given as circular spots (in um, like the svgs), instead of an svg frame """
+        spotlist = self.cmd.spots.add()
+        spotlist.frame_num = frame_num
+        spotlist.duration = duration
+        spotlist.x.extend(x)
+        spotlist.y.extend(y)
+        spotlist.z.extend(z if hasattr(z, '__len__') else [z])
+        spotlist.radius.extend(radius)
+        if weight is not None:
+            spotlist.weight.extend(weight)
+
 
 class Calibrate_Background(Message):
     def __init__(self):
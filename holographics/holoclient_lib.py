@@ -30,8 +30,21 @@ class Holoclient(object):
     def status(self):
         return Status().send(self.socket)
 
-    def play(self):
-        return Play().send(self.socket)
+    def play(self, wait=True):
+        return Play(wait).send(self.socket)
+
+    def stop(self):
+        return Stop().send(self.socket)
+
+    def clear_cache(self):
+        return Clear_Cache().send(self.socket)
+
+    def correct(self, correction_factor):
+        """ Applies a new correction factor to the generated frames, without computing them again """
+        reply = Correct(correction_factor).send(self.socket)
+        if reply[0].reply == holo_msg_pb2.StandardReply.ERROR:
+            print("Correct failed: %s" % reply[0].error_message)
+        return reply
 
     def generate(self, *args, **kwargs):
         return Generate(*args, **kwargs).send(self.socket)
@@ -0,0 +1,224 @@
+"""
+Software package for two-photon holographic optogenetics
+Copyright (C) 2014-2017  Joseph Donovan, Max Planck Institute of Neurobiology
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from __future__ import print_function, division
+import hashlib
+import os
+import tempfile
+from collections import namedtuple, OrderedDict
+
+import numpy as np
+
+# Bump whenever the hologram computation changes, so old cache entries are no longer used
+ALGORITHM_VERSION = 2
+
+
+class HologramRequest(namedtuple('HologramRequest',
+                                 ['raster_digests', 'Zlevels', 'wavelength', 'solver_params', 'version'])):
+    """
+    Compact, canonical description of everything that determines a hologram
+    Only the raster digests are stored, so building and comparing requests is cheap
+    """
+
+
+def raster_digest(raster):
+    """ sha1 of the raster contents (including shape and dtype) """
+    raster = np.ascontiguousarray(raster)
+    h = hashlib.sha1(repr((raster.shape, raster.dtype.str)).encode())
+    h.update(raster.data)
+    return h.hexdigest()
+
+
+def request_key(frames, wavelength, **solver_params):
+    """
+    Builds the HologramRequest for a set of contemporaneous frames
+    Fields that don't change the hologram (duration, frame_num, svg) are left out, so they don't cause cache misses
+    Float solver parameters are rounded, so float32 message fields and config values give the same key
+    """
+    return HologramRequest(raster_digests=tuple(f.raster_digest() for f in frames),
+                           Zlevels=tuple(round(float(f.Zlevel), 6) for f in frames),
+                           wavelength=round(float(wavelength), 3),
+                           solver_params=tuple(sorted((k, round(v, 6) if isinstance(v, float) else v)
+                                                      for k, v in solver_params.items())),
+                           version=ALGORITHM_VERSION)
+
+
+class HologramCache(object):
+    """
+    Persistent, content-addressed store of computed holograms, one .npy file per hologram
+    Entries survive restarts, the least recently used entries are removed once the cache grows past max_size_mb
+    The most recently used holograms are also kept in memory (up to memory_items), so repeated requests skip the disk
+    The size on disk is tracked as holograms are stored, the directory is only listed when it's over max_size_mb.
+    Other processes storing in the same directory aren't counted until then, so it can go over by their latest entries
+    """
+
+    suffix = '.npy'
+    temp_suffix = '.tmp'  # files being written, not entries yet
+    evict_to = .9  # of max_size_mb, so a full cache isn't listed on every store
+
+    def __init__(self, cachedir='./gsf_cache', max_size_mb=2000, memory_items=64):
+        self.cachedir = cachedir
+        self.max_size_mb = max_size_mb
+        self.memory_items = memory_items
+        self.memory = OrderedDict()
+        self.total_size = None  # bytes on disk, as of the last listing plus what was stored since
+        if not os.path.exists(cachedir):
+            os.makedirs(cachedir)
+
+    @staticmethod
+    def key(request):
+        """ File name for a HologramRequest """
+        return hashlib.sha1(repr(tuple(request)).encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cachedir, key + self.suffix)
+
+    def remember(self, request, hologram):
+        hologram.flags.writeable = False  # shared between requests, so it must not be modified in place
+        self.memory.pop(request, None)
+        self.memory[request] = hologram
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def get(self, request):
+        """ Returns the cached hologram, or None if it isn't in the cache """
+        hologram = self.memory.pop(request, None)
+        if hologram is not None:
+            self.memory[request] = hologram
+            return hologram
+
+        path = self.path(self.key(request))
+        try:
+            hologram = np.load(path)
+        except (IOError, OSError, ValueError):
+            return None
+        try:
+            os.utime(path, None)  # mark as recently used, for the LRU eviction
+        except OSError:
+            pass
+        self.remember(request, hologram)
+        return hologram
+
+    def put(self, request, hologram):
+        self.remember(request, hologram)
+        path = self.path(self.key(request))
+        fd, temppath = tempfile.mkstemp(suffix=self.temp_suffix, dir=self.cachedir)
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, hologram)
+            size = f.tell()
+        try:
+            os.rename(temppath, path)  # atomic, so other processes never see a partial file
+        except OSError:  # windows doesn't allow renaming over an existing file, that entry is already there anyway
+            os.remove(temppath)
+            return
+        if self.total_size is not None:
+            self.total_size += size
+        if self.total_size is None or self.total_size > self.max_size_mb * 2 ** 20:
+            self.evict()
+
+    def entries(self):
+        """ List of (last used time, size, path), oldest first """
+        entries = []
+        for f in os.listdir(self.cachedir):
+            if f.endswith(self.suffix):
+                path = os.path.join(self.cachedir, f)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return sorted(entries)
+
+    def size_mb(self):
+        return sum(size for _, size, _ in self.entries()) / 2 ** 20
+
+    def evict(self):
+        """ Lists the directory, and removes the least recently used entries once it's over max_size_mb """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        max_bytes = self.max_size_mb * 2 ** 20
+        if total > max_bytes:
+            max_bytes *= self.evict_to
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        self.total_size = total
+
+    def clear(self):
+        """ Removes all cached holograms """
+        self.memory.clear()
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.total_size = None
+
+
+class WarmStarts(object):
+    """
+    Recent solver phases, to seed the solver for similar targets (a few spots moved, a small intensity change)
+    Similarity is the normalized correlation of downsampled rasters, only between requests with the same Zlevels and
+    wavelength (the phase includes the lenses)
+    """
+
+    def __init__(self, max_items=16, min_similarity=.5, downsample=8):
+        self.max_items = max_items
+        self.min_similarity = min_similarity
+        self.downsample = downsample
+        self.entries = OrderedDict()  # request -> (planes key, signature, phase)
+
+    def signature(self, frames, wavelength):
+        planes = (round(float(wavelength), 3), tuple(round(float(f.Zlevel), 6) for f in frames))
+        d = self.downsample
+        blocks = []
+        for f in frames:
+            r = np.asarray(f.raster, dtype=np.float32)
+            h, w = r.shape[0] // d * d, r.shape[1] // d * d
+            blocks.append(np.sqrt(r[:h, :w].reshape(h // d, d, w // d, d).mean(axis=(1, 3))))  # amplitudes
+        sig = np.concatenate([b.ravel() for b in blocks])
+        norm = np.linalg.norm(sig)
+        return planes, sig / norm if norm else sig
+
+    def nearest(self, frames, wavelength):
+        """ Phase of the most similar recent solution, or None if nothing is similar enough """
+        if self.min_similarity is None or not self.entries:
+            return None
+        planes, sig = self.signature(frames, wavelength)
+        best, best_phase = self.min_similarity, None
+        for other_planes, other_sig, phase in self.entries.values():
+            if other_planes == planes and other_sig.shape == sig.shape:
+                similarity = np.dot(sig, other_sig)
+                if similarity >= best:
+                    best, best_phase = similarity, phase
+        return best_phase
+
+    def clear(self):
+        self.entries.clear()
+
+    def add(self, request, frames, wavelength, phase):
+        planes, sig = self.signature(frames, wavelength)
+        self.entries.pop(request, None)
+        self.entries[request] = (planes, sig, phase)
+        while len(self.entries) > self.max_items:
+            self.entries.popitem(last=False)
@@ -0,0 +1,195 @@
+"""
+Software package for two-photon holographic optogenetics
+Copyright (C) 2014-2017  Joseph Donovan, Max Planck Institute of Neurobiology
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from __future__ import print_function, division
+import os
+import shutil
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from frame import Frame, target_size
+
+
+class HologramSequence(object):
+    """
+    Holograms of a generated sequence, in one contiguous (frame, pattern, x, y) uint8 buffer, with a metadata table
+    (frame_num, duration, Z: mean Zlevel of the frame's planes, and the wavelength and correction factor of its
+    SLM corrections)
+    It's what is handed from the computation to playback and the trial archive, all of which work on views of the
+    buffer.  The uncorrected holograms are kept too, so the SLM corrections can be applied again (see correct)
+    Long sequences can be kept on disk instead, as memory mapped .npy files written as the frames are appended, which
+    can be played again later (see open)
+    Each sequence stored under a name gets a new numbered directory in it, so storing under the same name again never
+    touches files that may still be mapped (by playback or the trial archive); the previous ones are removed once the
+    new one is complete (see remove_previous)
+    """
+
+    meta_dtype = np.dtype([('frame_num', np.int32), ('duration', np.float64), ('Z', np.float64),
+                           ('wavelength', np.float64), ('correction_factor', np.float64)])
+
+    files = ('raw', 'holograms', 'meta')
+
+    def __init__(self, nframes, npatterns=1, shape=target_size, path=None):
+        """
+        :param path: directory to store the sequence in, memory mapped, instead of keeping it in memory
+        """
+        self.path = path
+        self.directory = None  # numbered directory in path, holding the files of this sequence
+        shape = (nframes, npatterns) + tuple(shape)
+        if path is None or not nframes:  # empty files can't be mapped
+            self.path = None
+            self.raw = np.zeros(shape, dtype=np.uint8)
+            self.holograms = np.zeros_like(self.raw)
+            self.meta = np.zeros(nframes, dtype=self.meta_dtype)
+        else:
+            generations = self.generations(path)
+            self.directory = os.path.join(path, str(generations[-1] + 1 if generations else 0))
+            os.makedirs(self.directory)
+            filepaths = self.filepaths(self.directory)
+            self.raw, self.holograms = [open_memmap(f, mode='w+', dtype=np.uint8, shape=shape) for f in filepaths[:2]]
+            self.meta = open_memmap(filepaths[2], mode='w+', dtype=self.meta_dtype, shape=(nframes,))
+        self.meta['frame_num'] = -1  # not appended yet
+        self.nframes = 0  # appended so far
+
+    @classmethod
+    def filepaths(cls, directory):
+        return [os.path.join(directory, name + '.npy') for name in cls.files]
+
+    @staticmethod
+    def generations(path):
+        """ Numbers of the sequences stored in path, oldest first """
+        if not os.path.isdir(path):
+            return []
+        return sorted(int(name) for name in os.listdir(path)
+                      if name.isdigit() and os.path.isdir(os.path.join(path, name)))
+
+    @classmethod
+    def open(cls, path):
+        """
+        Latest sequence stored in path, memory mapped (writable, so it can be corrected again), with the frames
+        appended so far.  A sequence whose generation was interrupted is only used if there's no complete one
+        :raises IOError: if there's no readable sequence in path
+        """
+        partial = None
+        for generation in reversed(cls.generations(path)):
+            directory = os.path.join(path, str(generation))
+            try:
+                sequence = cls.load(directory)
+            except (IOError, OSError, ValueError) as e:
+                print("Skipping unreadable sequence %s: %s" % (directory, e))
+                continue
+            sequence.path = path
+            if sequence.nframes == len(sequence.meta):
+                return sequence
+            if partial is None:
+                partial = sequence
+        if partial is None:
+            raise IOError("No readable sequence stored in %s" % path)
+        return partial
+
+    @classmethod
+    def load(cls, directory):
+        """ Sequence from the files in one numbered directory, see open """
+        sequence = cls.__new__(cls)
+        sequence.path = sequence.directory = directory
+        sequence.raw, sequence.holograms, sequence.meta = [np.load(f, mmap_mode='r+') for f in cls.filepaths(directory)]
+        if sequence.meta.dtype != cls.meta_dtype or sequence.raw.shape != sequence.holograms.shape or \
+                len(sequence.meta) != len(sequence.raw):
+            raise ValueError("Files don't belong to the same sequence")
+        appended = sequence.meta['frame_num'] >= 0
+        sequence.nframes = len(appended) if appended.all() else int(appended.argmin())
+        return sequence
+
+    def flush(self):
+        """ Writes a stored sequence out to disk """
+        if self.path is not None:
+            for a in (self.raw, self.holograms, self.meta):
+                a.flush()
+
+    def remove_previous(self):
+        """
+        Removes the sequences stored under the same name before this one
+        Files that are still mapped can't be removed on windows, those are removed the next time
+        """
+        if self.path is not None:
+            for generation in self.generations(self.path):
+                directory = os.path.join(self.path, str(generation))
+                if directory == self.directory:
+                    break
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def __len__(self):
+        return self.nframes
+
+    def __getitem__(self, index):
+        """ Frame with views of the (corrected) holograms, ie for Frameplayer.addframe """
+        if not -self.nframes <= index < self.nframes:
+            raise IndexError("Frame %d not in the sequence" % index)
+        meta = self.meta[index]
+        return Frame(holograms=list(self.holograms[index]), Zlevel=float(meta['Z']), frame_num=int(meta['frame_num']),
+                     duration=float(meta['duration']))
+
+    def __iter__(self):
+        for index in range(self.nframes):
+            yield self[index]
+
+    @property
+    def frame_nums(self):
+        return self.meta['frame_num'][:self.nframes]
+
+    @property
+    def durations(self):
+        return self.meta['duration'][:self.nframes]
+
+    @property
+    def wavelength(self):
+        """ Wavelength the holograms were corrected for (the one they were solved for), None without frames """
+        return float(self.meta['wavelength'][0]) if self.nframes else None
+
+    @property
+    def correction_factor(self):
+        """ Correction factor the holograms were corrected with, None without frames """
+        return float(self.meta['correction_factor'][0]) if self.nframes else None
+
+    def append(self, holograms, duration, Z=0):
+        """
+        Copies the uncorrected holograms of the next frame into the buffer
+        :return: index of the frame
+        """
+        index = self.nframes
+        assert index < len(self.meta), "Sequence is full"
+        assert len(holograms) == self.raw.shape[1]
+        for pattern, hologram in enumerate(holograms):
+            self.raw[index, pattern] = hologram
+        self.meta[index] = (index, duration, Z, np.nan, np.nan)  # not corrected yet
+        self.nframes += 1
+        return index
+
+    def correct(self, SLM_correction, wavelength, correction_factor, frames=slice(None)):
+        """ Applies the SLM corrections to the uncorrected holograms of the given frame(s), all of them by default """
+        if isinstance(frames, slice):
+            frames = slice(*frames.indices(self.nframes))
+        SLM_correction.correct(self.raw[frames], wavelength, correction_factor, out=self.holograms[frames])
+        self.meta['wavelength'][frames] = wavelength
+        self.meta['correction_factor'][frames] = correction_factor
+
+
+def valid_sequence_name(name):
+    """ Stored sequences are named by a plain directory name, no paths """
+    return bool(name) and os.path.basename(name) == name and name not in ('.', '..')
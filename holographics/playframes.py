@@ -23,14 +23,17 @@ from pyglet.gl import *
 from itertools import chain
 import time
 import gevent
-import cStringIO
-from PIL import Image
 
 pattern_time = 1 / 12.0 #When using multiple subpatterns, the time for each pattern
+default_refresh_rate = 60.0  # Hz, used if the screen doesn't report its refresh rate
 
 
 class Frameplayer(pyglet.window.Window):
-    def __init__(self, width=800, height=600, fullscreen=True, screen_num=None):
+    def __init__(self, width=800, height=600, fullscreen=True, screen_num=None, refresh_rate=None, lookahead=None):
+        """
+        :param lookahead: number of frames uploaded as textures ahead of the one shown, textures of frames already
+        shown are reused, so long sequences don't need a texture per frame. None uploads every frame when it's added
+        """
         platform = pyglet.window.get_platform()
         display = platform.get_default_display()
 
@@ -54,25 +57,132 @@ class Frameplayer(pyglet.window.Window):
             super(Frameplayer, self).__init__(width=width, height=height, vsync=True, screen=screen_h, fullscreen=fullscreen)
         self.set_caption("Frameplayer")
 
-        pyglet.clock.schedule_interval(self.update, 1 / 60.0)
+        if refresh_rate is None:
+            try:
+                refresh_rate = screen_h.get_mode().rate or default_refresh_rate
+            except Exception:  # not supported on every platform
+                refresh_rate = default_refresh_rate
+        self.refresh_rate = float(refresh_rate)
+        print("Frameplayer refresh rate %.2f Hz" % self.refresh_rate)
+
+        # frames are scheduled in flips, which needs the flip to wait for vsync, otherwise by the clock
+        interval = self.measure_flip_interval()
+        self.vsynced = interval > .5 / self.refresh_rate
+        if self.vsynced:
+            # redraw as fast as possible, the vsynced flip paces the loop at one draw per refresh
+            pyglet.clock.schedule(self.update)
+        else:
+            print("Warning: flips aren't synced to the display (%.2f ms apart), scheduling frames by the clock" %
+                  (1000 * interval))
+            pyglet.clock.schedule_interval(self.update, .25 / self.refresh_rate)
 
         self.nframes = None
         self.frames = None
-        pyglet.clock.set_fps_limit(60)
         self.fps_display = pyglet.clock.ClockDisplay()
 
-        self.starttime = None
-        self.patternnum = 0
+        self.playing = False
+        self.recording = False
+        self.flipcount = 0
+        self.flip_times = []
+        self.late_frames = set()
+        self.textures = []
+        self.free_textures = []
+        self.lookahead = None if lookahead is None else max(1, int(lookahead))
+        self.currentframe = 0
+        self.streaming = False
+        self.pattern_flips = max(1, int(round(pattern_time * self.refresh_rate)))
 
     def loadframes(self, frames):
-        self.frames = [[self.to_texture(holo) for holo in fr.holograms] for fr in frames]
-        self.durations = [fr.duration for fr in frames]
+        self.clearframes()
+        for frame in frames:
+            self.addframe(frame)
+
+    def clearframes(self, streaming=False):
+        """
+        :param streaming: more frames are added while playing, if playback catches up the last frame is held until
+        the next one is added (see end_stream)
+        """
+        self.streaming = streaming
+        self.free_textures.extend(self.textures)  # textures from the previous load are reused when the size matches
+        self.textures = []
+        self.sources = []  # frames, the textures are uploaded from their holograms
+        self.frames = []  # textures of each frame, None when not uploaded
+        self.durations = []
         self.currentframe = 0
+        self.window_start = 0  # with a lookahead, textures are only kept from this frame on
+
+        # each frame is shown for an exact number of refreshes, worked out before playing
+        self.frame_flips = []
+        self.frame_start_flips = np.zeros(1, dtype=int)
+
+    def addframe(self, frame):
+        """ Adds one more frame to the end of the sequence, uploaded now unless it's beyond the lookahead """
+        index = len(self.sources)
+        self.sources.append(frame)
+        self.frames.append(None)
+        if self.lookahead is None or index < self.window_start + self.lookahead:
+            self.upload(index)
+        self.durations.append(frame.duration)
+        self.frame_flips.append(max(1, int(round(frame.duration * self.refresh_rate))))
+        self.frame_start_flips = np.append(self.frame_start_flips, self.frame_start_flips[-1] + self.frame_flips[-1])
+
+    def end_stream(self):
+        """ All frames have been added, playback ends after the last one """
+        self.streaming = False
+
+    def upload(self, index):
+        if self.frames[index] is None:
+            self.frames[index] = [self.to_texture(holo, self.free_textures) for holo in self.sources[index].holograms]
+
+    def release(self, index):
+        """ Frees the textures of a frame for reuse, they're uploaded again if the frame is shown again """
+        textures = self.frames[index]
+        if textures is not None:
+            self.frames[index] = None
+            for texture in textures:
+                self.textures.remove(texture)
+            self.free_textures.extend(textures)
 
-    def to_texture(self, framedata):
-        temp = cStringIO.StringIO()
-        Image.fromarray(framedata.T).save(temp, format='png')
-        return pyglet.image.load('.png', file=temp).get_texture()
+    def update_window(self):
+        """ With a lookahead, keeps textures only for the current frame and the lookahead frames after it """
+        if self.lookahead is None:
+            return
+        start, end, nframes = self.currentframe, self.currentframe + self.lookahead, len(self.frames)
+        for index in range(self.window_start, min(start, nframes)):
+            self.release(index)
+        for index in range(max(end, self.window_start), min(self.window_start + self.lookahead, nframes)):
+            self.release(index)  # playing again from an earlier frame
+        self.window_start = start
+        for index in range(start, min(end, nframes)):
+            self.upload(index)
+
+    def to_texture(self, framedata, free_textures=()):
+        """
+        Uploads a uint8 hologram (stored transposed, as x by y) directly from its buffer, no image encoding
+        """
+        width, height = framedata.shape
+        # negative pitch: rows are ordered top to bottom
+        image = pyglet.image.ImageData(width, height, 'L', np.ascontiguousarray(framedata.T, dtype=np.uint8).tobytes(),
+                                       pitch=-width)
+
+        texture = next((t for t in free_textures if (t.width, t.height) == (width, height)), None)
+        if texture is None:
+            texture = pyglet.image.Texture.create(width, height)
+        else:
+            free_textures.remove(texture)
+        texture.blit_into(image, 0, 0, 0)
+        self.textures.append(texture)
+        return texture
+
+    def measure_flip_interval(self, flips=30):
+        """ Median time between flips of the blank window, one refresh if vsync works (pyglet may silently not) """
+        times = []
+        for i in range(flips):
+            self.clear()
+            super(Frameplayer, self).flip()
+            glFinish()
+            times.append(time.time())
+        return float(np.median(np.diff(times)))
 
     def update(self, dt):
         gevent.sleep(.001)
@@ -80,36 +190,101 @@ class Frameplayer(pyglet.window.Window):
     def on_draw(self):
         pyglet.gl.glClearColor(0, 0, 0, 0)
         self.clear()
+        if not self.frames:
+            return
 
-        if time.time() - self.starttime >= self.durations[self.currentframe]:
-            # print 'new frame', time.time() - self.starttime, self.durations[self.currentframe]
-            self.currentframe += 1
-            self.starttime = time.time()
+        if self.playing:
+            if self.vsynced:
+                elapsed = self.flipcount
+            else:  # refreshes by the clock
+                elapsed = int((time.time() - self.play_start) * self.refresh_rate)
+            position = elapsed - self.stall_flips  # position in the schedule
+            # the clock can get ahead of the draws: no frame is skipped, the schedule is shifted instead
+            limit = self.frame_start_flips[self.currentframe + 1] if self.frame_onset_flips else 0
+            if position > limit:
+                self.stall_flips += position - limit
+                position = limit
+            if position >= self.frame_start_flips[-1]:
+                if self.streaming:  # next frame not added yet, hold the last one
+                    self.stall_flips += position - (self.frame_start_flips[-1] - 1)
+                    self.late_frames.add(len(self.sources))
+                    position = self.frame_start_flips[-1] - 1
+                else:  # sequence done
+                    pyglet.app.event_loop.has_exit = True
+                    self.playing = False
+                    self.currentframe = 0
+            if self.playing:
+                frame = np.searchsorted(self.frame_start_flips, position, side='right') - 1
+                if frame != self.currentframe or not self.frame_onset_flips:
+                    self.frame_onset_flips.append(self.flipcount)
+                self.currentframe = frame
 
-            if self.currentframe == len(self.frames):
-                pyglet.app.event_loop.has_exit = True
-                self.currentframe = 0
-                self.patternnum = 0
+        self.update_window()
+        patterns = self.frames[self.currentframe]
+        patternnum = 0
+        if self.playing:  # only relevant when using multiple patterns per frame
+            patternnum = (position - self.frame_start_flips[self.currentframe]) // self.pattern_flips
+        patterns[patternnum % len(patterns)].blit(0, 0, 0)
 
-        self.frames[self.currentframe][int(self.patternnum)].blit(0, 0, 0)
+    def flip(self):
+        super(Frameplayer, self).flip()
+        if self.recording:
+            glFinish()  # make sure the buffer swap happened before taking the time
+            self.flip_times.append(time.time())
+            self.flipcount += 1
+            self.recording = self.playing  # the flip ending the sequence is the last one timed
 
-        self.patternnum = (self.patternnum + pattern_time) % len(self.frames[self.currentframe])
-        #only relevant when using multiple patterns per frame
+    def start_playing(self):
+        self.play_start = time.time()
+        self.flipcount = 0
+        self.flip_times = []
+        self.stall_flips = 0
+        self.late_frames = set()  # frames playback had to wait for
+        self.frame_onset_flips = []
+        self.currentframe = 0
+        self.playing = True
+        self.recording = True
+
+    def stop(self):
+        """ Stops playing after the current refresh """
+        self.playing = False
+        pyglet.app.event_loop.has_exit = True
+
+    def frame_timing(self):
+        """
+        Timing of the last played sequence, from the recorded flip times
+        :return: frame onsets (s, relative to the first frame) and per frame timing errors (s, shown minus requested
+        duration)
+        """
+        if not self.flip_times:
+            return np.zeros(0), np.zeros(0)
+        flip_times = np.asarray(self.flip_times)
+        starts = np.asarray(self.frame_onset_flips + [len(flip_times) - 1], dtype=int)
+        onsets = flip_times[starts] - flip_times[0]
+        shown = np.diff(onsets)
+        errors = shown - np.asarray(self.durations[:len(shown)])
+        return onsets[:len(shown)], errors
+
+    def frames_ready_in_time(self):
+        """
+        For the last played sequence, whether each frame was added before its scheduled onset
+        The schedule is shifted by every stall, so only the frames playback stalled for are late, not the ones after
+        """
+        return np.array([index not in self.late_frames for index in range(len(self.sources))], dtype=bool)
 
     def playframes(self):
-        self.starttime = time.time()
+        self.start_playing()
         pyglet.app.run()
 
     def playframes_nonblocking(self):
-        self.starttime = time.time()
+        self.start_playing()
         return gevent.spawn(pyglet.app.run)
 
     def playframes_with_callback(self, callback, calltime):
-        self.starttime = time.time()
+        self.start_playing()
 
         def dummy(dt):
             callback()
 
         pyglet.clock.schedule_once(dummy, calltime)
         pyglet.app.run()
-
@@ -0,0 +1,83 @@
+"""
+Software package for two-photon holographic optogenetics
+Copyright (C) 2014-2017  Joseph Donovan, Max Planck Institute of Neurobiology
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from __future__ import print_function, division
+import time
+
+import numpy as np
+
+from GSF_3D import GS_3D_buffered
+from frame import compute_size
+
+
+def spot_targets(nplanes, nspots=10, radius=8, seed=0):
+    """ Random circular spots on each plane, like typical cell targeting patterns """
+    rs = np.random.RandomState(seed)
+    yy, xx = np.mgrid[:compute_size[1], :compute_size[0]]
+    targets = []
+    for p in range(nplanes):
+        target = np.zeros((compute_size[1], compute_size[0]), dtype=np.uint8)
+        for x, y in rs.randint(100, min(compute_size) - 100, size=(nspots, 2)):
+            target[(xx - x) ** 2 + (yy - y) ** 2 <= radius ** 2] = rs.randint(128, 256)
+        targets.append(target)
+    return targets
+
+
+def uniformity(values):
+    return 1 - (values.max() - values.min()) / (values.max() + values.min())
+
+
+def compare(nplanes, iterations=30, seed=0):
+    """
+    Solves the same targets in single and double precision, from the same random start
+    :return: dict with the final correlations and plane uniformity of each, how much the 8 bit holograms differ and
+    the time taken
+    """
+    targets = spot_targets(nplanes, seed=seed)
+    Zs = np.linspace(-20, 20, nplanes) if nplanes > 1 else [0]
+    results = {}
+    for precision in ('double', 'single'):
+        np.random.seed(seed)
+        t1 = time.time()
+        res = GS_3D_buffered(targets, Zs, iterations=iterations, precision=precision, export=True)
+        results[precision] = res, time.time() - t1
+
+    (double, t_double), (single, t_single) = results['double'], results['single']
+    levels = [np.round((r.phase % (2 * np.pi)) * 255 / (2 * np.pi)).astype(int) % 256 for r in (double, single)]
+    level_diff = np.abs(levels[0] - levels[1])
+    level_diff = np.minimum(level_diff, 256 - level_diff)  # phase wraps around
+    return dict(nplanes=nplanes,
+                corr_double=double.correlations[-1].sum(), corr_single=single.correlations[-1].sum(),
+                uniformity_double=uniformity(double.correlations[-1]),
+                uniformity_single=uniformity(single.correlations[-1]),
+                levels_differing=(level_diff > 1).mean(), max_level_diff=level_diff.max(),
+                t_double=t_double, t_single=t_single)
+
+
+def parity(nplanes=(1, 3, 6), iterations=30):
+    print("%7s %11s %11s %11s %11s %9s %9s %9s" % ('nplanes', 'corr dbl', 'corr sgl', 'unif dbl', 'unif sgl',
+                                                    '>1 level', 's dbl', 's sgl'))
+    for n in nplanes:
+        r = compare(n, iterations)
+        print("%7d %11.5f %11.5f %11.5f %11.5f %8.2f%% %9.2f %9.2f" % (
+            n, r['corr_double'], r['corr_single'], r['uniformity_double'], r['uniformity_single'],
+            100 * r['levels_differing'], r['t_double'], r['t_single']))
+
+
+if __name__ == '__main__':
+    parity()
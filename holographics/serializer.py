@@ -16,6 +16,8 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+import numpy as np
+
 from frame import Frame
 
 
@@ -47,4 +49,25 @@ def unserialize(msg, cmdtype):
     for i, frame in enumerate(msg):
         framelist[i].svg = frame
 
+    spotlists = getattr(cmdtype, 'spots', ())  # commands only
+    if len(spotlists):
+        for spotlist in spotlists:
+            framelist += spot_frames(spotlist)
+        framelist.sort(key=lambda f: f.frame_num)  # stable, svg frames of a frame_num come first
+
     return cmdtype, framelist
+
+
+def spot_frames(spotlist):
+    """ Frames for a SpotList message, one per Z level, holding their spots as rows of (x, y, radius, weight) """
+    n = len(spotlist.x)
+    assert len(spotlist.y) == len(spotlist.radius) == n
+    assert len(spotlist.z) in (1, n) and len(spotlist.weight) in (0, n)
+    if n == 0:  # blank frame
+        return [Frame(spots=np.zeros((0, 4)), frame_num=spotlist.frame_num, duration=spotlist.duration)]
+
+    weights = spotlist.weight if len(spotlist.weight) else np.ones(n)
+    spots = np.column_stack([spotlist.x, spotlist.y, spotlist.radius, weights])
+    z = np.resize(np.asarray(spotlist.z, dtype=float), n)  # a single z applies to all spots
+    return [Frame(spots=spots[z == Z], Zlevel=float(Z), frame_num=spotlist.frame_num, duration=spotlist.duration)
+            for Z in np.unique(z)]
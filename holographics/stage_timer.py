@@ -0,0 +1,54 @@
+"""
+Software package for two-photon holographic optogenetics
+Copyright (C) 2014-2017  Joseph Donovan, Max Planck Institute of Neurobiology
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from __future__ import print_function, division
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class StageTimer(object):
+    """
+    Accumulates the time spent in each stage of a computation, and the time at which named events happened
+    """
+
+    def __init__(self):
+        self.start = time.time()
+        self.stages = OrderedDict()
+        self.events = OrderedDict()
+
+    @contextmanager
+    def __call__(self, stage):
+        t = time.time()
+        try:
+            yield
+        finally:
+            self.add(stage, time.time() - t)
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.) + seconds
+
+    def mark(self, event):
+        """ Records the time since the start, only the first time each event is marked """
+        self.events.setdefault(event, time.time() - self.start)
+
+    def total(self):
+        return time.time() - self.start
+
+    def report(self):
+        return ', '.join(["%s %.3fs" % item for item in list(self.stages.items()) + list(self.events.items())])
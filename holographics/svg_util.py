@@ -16,35 +16,42 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-from __future__ import print_function
+from __future__ import print_function, division
+import re
 from svgfig import SVG, canvas
 from xml.etree import ElementTree as ET
-import cStringIO
 import numpy as np
 import cairosvg
-from svgfig import load_stream
-from scipy.misc import imread
 
 ET.register_namespace('', "http://www.w3.org/2000/svg")
+ET.register_namespace('xlink', "http://www.w3.org/1999/xlink")
+
+# insertTransform, set_svg_bounds and add_background take an svg string and return a string, or take a parsed svg
+# (see parse_svg) and change it in place, so a frame's svg is only parsed and serialized once for all of them
+
+
+def parse_svg(svg):
+    """ Root element of an svg string, parsed svgs are returned as they are """
+    if ET.iselement(svg):
+        return svg
+    return ET.fromstring(svg)
+
+
+def _same_type(svg, root):
+    return root if ET.iselement(svg) else ET.tostring(root)
 
 
 def insertTransform(svg, transform_matrix):
-    c = cStringIO.StringIO()
-    c.write(svg)
-    c.seek(0)
-    p = ET.parse(c)
-    root = p.getroot()
-
-    newroot = root.copy()
-    elems = [elem for elem in newroot]
+    root = parse_svg(svg)
+    elems = [elem for elem in root]
     for elem in elems:
-        newroot.remove(elem)
+        root.remove(elem)
 
     matrix_string = "matrix(%f, %f, %f, %f, %f, %f)" % tuple(transform_matrix[:2, :].ravel()[[0, 3, 1, 4, 2, 5]])
-    g = ET.SubElement(newroot, 'g', transform=matrix_string)
+    g = ET.SubElement(root, 'g', transform=matrix_string)
 
     [g.append(elem) for elem in elems]
-    return ET.tostring(newroot)
+    return _same_type(svg, root)
 
 
 def generate_circle_svg(x=60, y=60, r=30, width=792, height=600, colorhex="ff"):
@@ -83,41 +90,255 @@ def empty_svg(width=792, height=600):
 
 
 def add_background(svg):
-    c = cStringIO.StringIO()
-    c.write(svg)
-    c.seek(0)
-    p = ET.parse(c)
-    root = p.getroot()
+    root = parse_svg(svg)
     root.set('style', "background-color:black")
-    return ET.tostring(root)
+    return _same_type(svg, root)
 
 
-def surface_to_np(surface):
-    """ Transforms a Cairo surface into a numpy array. """
-    temp_buf = cStringIO.StringIO()
-    surface.cairo.write_to_png(temp_buf)
-    surface.finish()
-    temp_buf.seek(0)
-    return imread(temp_buf)  # WxHx4 - RGBA
+def surface_to_np(surface, channel=0):
+    """
+    Returns one color channel of a Cairo image surface, as a (HxW) view on the surface's pixel buffer
+    Cairo stores premultiplied ARGB32, so for grey patterns each color channel is the image composited over black
+    """
+    image = surface.cairo
+    image.flush()
+    data = np.ndarray(shape=(image.get_height(), image.get_stride() // 4, 4), dtype=np.uint8,
+                      buffer=image.get_data())
+    return data[:, :image.get_width(), channel]
 
 
 def svg_to_np(svg_bytestring, dpi):
-    """ Renders a svg bytestring as a RGB image in a numpy array """
+    """ Renders a svg bytestring, returns a single (grey) channel in a numpy array """
     tree = cairosvg.parser.Tree(bytestring=svg_bytestring)
-    surf = cairosvg.surface.SVGSurface(tree, output=None, dpi=dpi)
+    surf = cairosvg.surface.PNGSurface(tree, output=None, dpi=dpi)  # image surface, rendered without writing a png
     return surface_to_np(surf)
 
 
+def svg_tag(elem):
+    return elem.tag.rsplit('}', 1)[-1]
+
+
+transform_re = re.compile(r'\s*(matrix|translate|scale)\s*\(([^)]*)\)\s*,?')
+
+
+def parse_transform(transform):
+    """ Parses a svg transform attribute into a 3x3 matrix, returns None for unsupported transforms (ie rotate) """
+    m = np.identity(3)
+    if not transform:
+        return m
+    pos = 0
+    for match in transform_re.finditer(transform):
+        if match.start() != pos:
+            return None
+        pos = match.end()
+        name = match.group(1)
+        try:
+            vals = [float(v) for v in re.split(r'[\s,]+', match.group(2).strip())]
+        except ValueError:
+            return None
+        if name == 'matrix' and len(vals) == 6:
+            t = [[vals[0], vals[2], vals[4]], [vals[1], vals[3], vals[5]], [0, 0, 1]]
+        elif name == 'translate' and len(vals) in (1, 2):
+            t = [[1, 0, vals[0]], [0, 1, vals[1] if len(vals) == 2 else 0], [0, 0, 1]]
+        elif name == 'scale' and len(vals) in (1, 2):
+            t = [[vals[0], 0, 0], [0, vals[-1], 0], [0, 0, 1]]
+        else:
+            return None
+        m = np.dot(m, t)
+    if pos != len(transform):
+        return None
+    return m
+
+
+named_greys = {'white': 255, 'black': 0}
+
+
+def parse_grey(color):
+    """ Intensity of a grey svg color (ie #fff, #808080 or white), None if it isn't grey """
+    color = color.strip().lower()
+    if color in named_greys:
+        return named_greys[color]
+    if re.match(r'^#[0-9a-f]{3}$', color):
+        color = '#' + ''.join(c * 2 for c in color[1:])
+    if re.match(r'^#[0-9a-f]{6}$', color) and color[1:3] == color[3:5] == color[5:7]:
+        return int(color[1:3], 16)
+    return None
+
+
+def simple_fill(elem, fill):
+    """
+    Returns the fill intensity for the element (inheriting fill), or None if its styling isn't supported by
+    circles_to_np (strokes, opacity, non-grey colors, ...)
+    """
+    props = dict(elem.attrib)
+    for decl in props.pop('style', '').split(';'):
+        if decl.strip():
+            name, _, value = decl.partition(':')
+            props[name.strip()] = value.strip()
+    for name, value in props.items():
+        if name == 'fill':
+            fill = parse_grey(value)
+            if fill is None:
+                return None
+        elif name == 'stroke':
+            if value != 'none':
+                return None
+        elif name in ('opacity', 'fill-opacity', 'filter', 'mask', 'clip-path', 'display', 'visibility',
+                      'preserveAspectRatio'):
+            return None
+    return fill
+
+
+def find_shapes(elem, transform, fill, shapes):
+    """
+    Collects (transform, cx, cy, rx, ry, intensity) for every circle/ellipse inside elem, in drawing order
+    Returns False if there is anything that isn't a plain filled circle or ellipse
+    """
+    fill = simple_fill(elem, fill)
+    local_transform = parse_transform(elem.get('transform'))
+    if fill is None or local_transform is None:
+        return False
+    transform = np.dot(transform, local_transform)
+
+    tag = svg_tag(elem)
+    if tag == 'g':
+        return all(find_shapes(child, transform, fill, shapes) for child in elem)
+    elif tag in ('circle', 'ellipse') and len(elem) == 0:
+        try:
+            cx, cy = float(elem.get('cx', 0)), float(elem.get('cy', 0))
+            if tag == 'circle':
+                rx = ry = float(elem.get('r', 0))
+            else:
+                rx, ry = float(elem.get('rx', 0)), float(elem.get('ry', 0))
+        except ValueError:  # units, percentages
+            return False
+        if rx > 0 and ry > 0:
+            shapes.append((transform, cx, cy, rx, ry, fill))
+        return True
+    return False
+
+
+def pixel_shapes(svg, shape):
+    """
+    Parses an svg made only of filled grey circles/ellipses (ie from generate_circles_svg), with translate/scale/matrix
+    transforms, for an image of the given shape
+    :param svg: svg string or parsed svg, with a viewBox
+    :param shape: (rows, columns) of the image
+    :return: list of (L, t, intensity), the affine map from the unit circle to the shape in pixels (x, y), in drawing
+    order, or None if the svg isn't simple enough
+    """
+    try:
+        root = parse_svg(svg)
+        viewbox = [float(v) for v in re.split(r'[\s,]+', root.get('viewBox', '').strip())]
+    except (ET.ParseError, ValueError):
+        return None
+    if svg_tag(root) != 'svg' or len(viewbox) != 4 or viewbox[2] <= 0 or viewbox[3] <= 0:
+        return None
+
+    fill = simple_fill(root, 0)
+    if fill is None or root.get('transform') is not None:
+        return None
+    shapes = []
+    if not all(find_shapes(child, np.identity(3), fill, shapes) for child in root):
+        return None
+
+    pixels = viewbox_transform(viewbox, shape)
+    mapped = []
+    for transform, cx, cy, rx, ry, fill in shapes:
+        A = np.dot(np.dot(pixels, transform), [[rx, 0, cx], [0, ry, cy], [0, 0, 1]])
+        mapped.append((A[:2, :2], A[:2, 2], fill))
+    return mapped
+
+
+def viewbox_transform(viewbox, shape):
+    """ Affine map (3x3) from svg user units to pixels of an image of the given shape, for the default
+    preserveAspectRatio (xMidYMid meet) """
+    scale = min(shape[1] / viewbox[2], shape[0] / viewbox[3])
+    return np.array([[scale, 0, (shape[1] - viewbox[2] * scale) / 2 - viewbox[0] * scale],
+                     [0, scale, (shape[0] - viewbox[3] * scale) / 2 - viewbox[1] * scale],
+                     [0, 0, 1]])
+
+
+def circles_to_np(svg, shape):
+    """
+    Fast path for rendering svgs made only of filled grey circles/ellipses (see pixel_shapes).  Each shape is drawn
+    as an anti-aliased mask over a black background, only over its own bounding box, without going through cairo.
+    :param svg: svg string or parsed svg, with a viewBox
+    :param shape: (rows, columns) of the output image
+    :return: uint8 array, or None if the svg isn't simple enough (use svg_to_np instead)
+    """
+    shapes = pixel_shapes(svg, shape)
+    if shapes is None:
+        return None
+    return shapes_to_np(shapes, shape)
+
+
+def shapes_to_np(shapes, shape):
+    """ Draws (L, t, intensity) shapes (see pixel_shapes) into a uint8 image of the given shape """
+    image = np.zeros(shape)
+    for L, t, fill in shapes:
+        if abs(np.linalg.det(L)) < 1e-12:
+            continue
+        Linv = np.linalg.inv(L)
+
+        half = np.hypot(L[:, 0], L[:, 1]) + 1  # bounding box half size (x, y), with a pixel margin for anti-aliasing
+        x0, x1 = max(int(np.floor(t[0] - half[0])), 0), min(int(np.ceil(t[0] + half[0])), shape[1])
+        y0, y1 = max(int(np.floor(t[1] - half[1])), 0), min(int(np.ceil(t[1] + half[1])), shape[0])
+        if x0 >= x1 or y0 >= y1:
+            continue
+        px, py = np.meshgrid(np.arange(x0, x1) + .5 - t[0], np.arange(y0, y1) + .5 - t[1])
+
+        qx = Linv[0, 0] * px + Linv[0, 1] * py
+        qy = Linv[1, 0] * px + Linv[1, 1] * py
+        qr = np.hypot(qx, qy)
+        # distance to the edge in pixels ~ (|q| - 1) / |grad |q||
+        with np.errstate(invalid='ignore', divide='ignore'):
+            grad = np.hypot(Linv[0, 0] * qx + Linv[1, 0] * qy, Linv[0, 1] * qx + Linv[1, 1] * qy) / qr
+            coverage = np.clip(.5 - (qr - 1) / grad, 0, 1)
+        coverage[qr == 0] = 1
+
+        region = image[y0:y1, x0:x1]
+        region += coverage * (fill - region)
+    return np.round(image).astype('uint8')
+
+
+def circles_to_spots(svg, shape):
+    """
+    Centres and sizes of the circles/ellipses of a simple svg (see pixel_shapes), for spot based hologram computation
+    Black shapes are left out, they would only mask others
+    :return: array of (x, y, radius, intensity) rows, in pixels of an image of the given shape (pixel centres at
+    integer coordinates, like array indices), or None if the svg isn't simple enough
+    """
+    shapes = pixel_shapes(svg, shape)
+    if shapes is None:
+        return None
+    return shapes_to_spots(shapes)
+
+
+def shapes_to_spots(shapes):
+    """ (x, y, radius, intensity) rows for (L, t, intensity) shapes, see circles_to_spots """
+    spots = [(t[0] - .5, t[1] - .5, abs(np.linalg.det(L)) ** .5, fill) for L, t, fill in shapes if fill > 0]
+    return np.array(spots, dtype=float).reshape(-1, 4)
+
+
+def spots_to_shapes(spots, viewbox, shape):
+    """
+    Shapes (see pixel_shapes) for a table of circular spots, as if drawn in an svg with that viewBox (the same as
+    generate_circles_svg after set_svg_bounds), without any svg
+    :param spots: rows of (x, y, radius, weight), in svg user units, weight from 0 to 1 (1 is a white circle)
+    """
+    pixels = viewbox_transform(viewbox, shape)
+    spots = np.asarray(spots, dtype=float).reshape(-1, 4)
+    centres = np.dot(spots[:, :2], pixels[:2, :2].T) + pixels[:2, 2]
+    return [(pixels[:2, :2] * r, t, 255 * min(max(w, 0), 1)) for t, (_, _, r, w) in zip(centres, spots)]
+
+
 def set_svg_bounds(svg, x, y, w, h):
-    c = cStringIO.StringIO()
-    c.write(svg)
-    c.seek(0)
-    svg = load_stream(c)
-
-    svg['viewBox'] = u'%.4f %.4f %.4f %.4f' % (x, y, w, h)
-    svg['height'] = u'100%'
-    svg['width'] = u'100%'
-    return svg.standalone_xml()
+    root = parse_svg(svg)
+    root.set('viewBox', u'%.4f %.4f %.4f %.4f' % (x, y, w, h))
+    root.set('height', u'100%')
+    root.set('width', u'100%')
+    return _same_type(svg, root)
 
 
 if __name__ == '__main__':
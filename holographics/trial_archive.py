@@ -0,0 +1,103 @@
+"""
+Software package for two-photon holographic optogenetics
+Copyright (C) 2014-2017  Joseph Donovan, Max Planck Institute of Neurobiology
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from __future__ import print_function, division
+import os
+import Queue
+import threading
+import time
+import traceback
+
+import numpy as np
+
+
+class TrialArchiver(object):
+    """
+    Logs every played trial to disk from a background thread, so the PLAY reply doesn't wait on file writes
+    Each trial is a single compressed .npz, holding the requested svgs, the played holograms and the metadata
+    """
+
+    def __init__(self, directory='./_trials', maxsize=16):
+        self.directory = directory
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.queue = Queue.Queue(maxsize)  # bounded, if the disk can't keep up trials are dropped, see archive
+        self.thread = threading.Thread(target=self.run, name='TrialArchiver')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def archive(self, timestamp, pre_frames, postgsf_frames, **metadata):
+        """
+        Queues a trial for writing
+        :param timestamp: time.struct_time of the start of the trial, used for the file name
+        :param pre_frames: frames as requested (svgs, before calibration)
+        :param postgsf_frames: played HologramSequence
+        :param metadata: extra arrays/values to store (ie wavelength, frame timing)
+        :return: False if the queue is full and the trial wasn't archived (never waits, it's called from the event loop)
+        """
+        try:
+            self.queue.put_nowait((timestamp, pre_frames, postgsf_frames, metadata))
+        except Queue.Full:
+            print("error saving trial log data, %d trials are still being written!!!!!!!!!!!!!!!!!!!" %
+                  self.queue.qsize())
+            return False
+        return True
+
+    def run(self):
+        while True:
+            trial = self.queue.get()
+            try:
+                self.write(*trial)
+            except Exception:
+                traceback.print_exc()
+                print("error saving trial log data!!!!!!!!!!!!!!!!!!!")
+            finally:
+                self.queue.task_done()
+
+    def pending(self):
+        """ Number of trials queued or being written """
+        return self.queue.unfinished_tasks
+
+    def flush(self):
+        """ Waits until all queued trials are written """
+        self.queue.join()
+
+    def write(self, timestamp, pre_frames, postgsf_frames, metadata):
+        basename = time.strftime("%Y_%m_%d__%H-%M-%S", timestamp)
+        filepath = os.path.join(self.directory, basename + '.npz')
+        n = 1
+        while os.path.exists(filepath):
+            filepath = os.path.join(self.directory, basename + '_%d.npz' % n)
+            n += 1
+
+        np.savez_compressed(filepath,
+                            holograms=postgsf_frames.holograms[:len(postgsf_frames)],  # frame, pattern, x, y
+                            frame_nums=postgsf_frames.frame_nums,
+                            durations=postgsf_frames.durations,
+                            svgs=np.array([f.svg or '' for f in pre_frames]),
+                            svg_frame_nums=np.array([f.frame_num for f in pre_frames]),
+                            svg_Zlevels=np.array([f.Zlevel for f in pre_frames]),
+                            spots=np.array([(i,) + tuple(s) for i, f in enumerate(pre_frames) if f.spots is not None
+                                            for s in f.spots]).reshape(-1, 5),  # pre_frame index, x, y, radius, weight
+                            **metadata)
+
+
+def load_trial(filepath):
+    """ Reads back an archived trial as a dict of arrays """
+    with np.load(filepath) as trial:
+        return dict(trial.items())